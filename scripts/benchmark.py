@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+"""Benchmark the MediaWiki converter and the docs validator.
+
+Times every conversion pass, both engines of convert_text, convert_page, the
+end-to-end local-mode main() and validate_docs.check_file on:
+
+- synthetic corpora (deep lists, wide tables, huge galleries, pathological
+  and unbalanced '' emphasis and a mixed page) generated at several sizes;
+- the real docs/ pages as a baseline.
+
+The peak memory of convert_lines on pages of many tables is reported as
+well: it should stay the same however long the page grows.
+
+Results are written as JSON so that runs can be compared:
+
+    python scripts/benchmark.py --output before.json
+    ... change the converter ...
+    python scripts/benchmark.py --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import convert_mediawiki_to_md as converter
+import validate_docs
+import wiki_templates
+
+SIZES = {"small": 1, "medium": 4, "large": 16}
+
+# Passes of the legacy pipeline, in the order convert_text_legacy applies them
+PASSES: tuple[tuple[str, Callable[[str], str]], ...] = (
+    ("tables", converter.convert_tables),
+    ("galleries", converter.convert_galleries),
+    ("categories", converter.remove_category_links),
+    ("lists", converter.convert_lists),
+    ("headings", converter.convert_headings),
+    ("emphasis", converter.convert_emphasis),
+    ("external_links", converter.convert_external_links),
+    ("internal_links", converter.convert_internal_links),
+)
+
+_WORDS = (
+    "датчик", "sensor", "питание", "ESP32", "плата", "module", "вода", "pH",
+    "контроллер", "relay", "температура", "pump", "схема", "wiring",
+)
+
+
+def _words(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(_WORDS) for _ in range(n))
+
+
+def _deep_lists(rnd: random.Random, scale: int) -> str:
+    lines = ["== Список ==", ""]
+    for _ in range(200 * scale):
+        depth = rnd.randint(1, 6)
+        marker = "".join(rnd.choice("*#") for _ in range(depth))
+        lines.append(f"{marker} {_words(rnd, 4)} [[{rnd.choice(_WORDS)}]]")
+        if rnd.random() < 0.05:
+            lines.append(_words(rnd, 8))
+    return "\n".join(lines) + "\n"
+
+
+def _wide_tables(rnd: random.Random, scale: int) -> str:
+    columns = 40
+    lines = ["== Таблица ==", '{| class="wikitable"']
+    lines.append("! " + " !! ".join(f"col {c}" for c in range(columns)))
+    for _ in range(50 * scale):
+        lines.append("|-")
+        lines.append("| " + " || ".join(_words(rnd, 2) for _ in range(columns)))
+    lines.append("|}")
+    return "\n".join(lines) + "\n"
+
+
+def _huge_gallery(rnd: random.Random, scale: int) -> str:
+    lines = ["== Галерея ==", "<gallery>"]
+    for i in range(300 * scale):
+        ext = rnd.choice(("png", "jpg", "gif"))
+        lines.append(f"Файл:image_{i}.{ext}|thumb|{_words(rnd, 3)}")
+    lines.append("</gallery>")
+    return "\n".join(lines) + "\n"
+
+
+def _pathological_emphasis(rnd: random.Random, scale: int) -> str:
+    lines = []
+    for _ in range(500 * scale):
+        parts = []
+        for _ in range(rnd.randint(2, 10)):
+            parts.append(rnd.choice(("''", "'''", "'''''", "'", _words(rnd, 1))))
+        lines.append(" ".join(parts))
+    return "\n".join(lines) + "\n"
+
+
+def _unbalanced_emphasis(rnd: random.Random, scale: int) -> str:
+    """Apostrophe runs that never close: contractions, pasted code."""
+
+    lines = ["'''" + _words(rnd, 3), "''" + _words(rnd, 3)]
+    for i in range(500 * scale):
+        kind = i % 4
+        if kind == 0:
+            lines.append(f"{_words(rnd, 3)} it''s {_words(rnd, 5)}")
+        elif kind == 1:
+            lines.append(f"    printf('%s', ''); x = '''{_words(rnd, 1)}")
+        elif kind == 2:
+            lines.append("'" * rnd.randint(2, 12) + _words(rnd, 4))
+        else:
+            lines.append(_words(rnd, 8))
+    return "\n".join(lines) + "\n"
+
+
+def _mixed_page(rnd: random.Random, scale: int) -> str:
+    lines = []
+    for section in range(10 * scale):
+        lines.append(f"== Раздел {section} ==")
+        lines.append(
+            f"{_words(rnd, 10)} '''{_words(rnd, 2)}''' [[{rnd.choice(_WORDS)}|ссылка]] "
+            f"[https://wega-project.ru/{section} {_words(rnd, 2)}] ''{_words(rnd, 3)}''"
+        )
+        lines.append(f"[[Файл:photo_{section}.jpg|thumb|{_words(rnd, 3)}]]")
+        lines.append("* " + _words(rnd, 5))
+        lines.append("** " + _words(rnd, 5))
+        lines.append("# " + _words(rnd, 5))
+        lines.append('{| class="wikitable"')
+        lines.append("! a !! b")
+        lines.append("|-")
+        lines.append(f"| {_words(rnd, 2)} || {_words(rnd, 2)}")
+        lines.append("|}")
+        lines.append("")
+    lines.append("[[Категория:Датчики]]")
+    return "\n".join(lines) + "\n"
+
+
+GENERATORS: dict[str, Callable[[random.Random, int], str]] = {
+    "deep_lists": _deep_lists,
+    "wide_tables": _wide_tables,
+    "huge_gallery": _huge_gallery,
+    "emphasis": _pathological_emphasis,
+    "unbalanced_emphasis": _unbalanced_emphasis,
+    "mixed": _mixed_page,
+}
+
+
+def generate_corpus(size: str, pages: int = 5, seed: int = 0) -> dict[str, str]:
+    """Generate {page_name: mediawiki_text} with ``pages`` pages of each kind."""
+
+    rnd = random.Random(f"{seed}-{size}")
+    corpus: dict[str, str] = {}
+    for kind, generate in GENERATORS.items():
+        for i in range(pages):
+            corpus[f"{kind}_{i}"] = generate(rnd, SIZES[size])
+    return corpus
+
+
+def link_heavy_page(links: int = 2000, seed: int = 0) -> str:
+    """A page that is mostly page, image, video and download links."""
+
+    rnd = random.Random(seed)
+    targets = (
+        "{word}",
+        "{word}|{word} {word}",
+        "Файл:{word}_{i}.png|thumb|{word}",
+        "File:{word} {i}.JPG",
+        "Файл:{word}_{i}.mp4",
+        ":Файл:{word}_{i}.pdf|{word}",
+    )
+    parts = []
+    for i in range(links):
+        target = rnd.choice(targets).format(word=rnd.choice(_WORDS), i=i)
+        parts.append(f"[[{target}]]")
+    return "\n".join(" ".join(parts[i:i + 8]) for i in range(0, len(parts), 8)) + "\n"
+
+
+def bench_links(repeat: int, links: int = 2000) -> dict[str, list[float]]:
+    """Per-link cost of link rendering, image extraction and galleries.
+
+    Times are reported per 1000 links (ms per 1000 = µs per link).
+    """
+
+    page = link_heavy_page(links)
+    gallery = [
+        f"Файл:{_WORDS[i % len(_WORDS)]}_{i}.png|thumb|caption {i}" for i in range(links)
+    ]
+    scale = 1000 / links
+    benches = {
+        "internal_links": lambda: converter.convert_internal_links(page),
+        "extract_image_filenames": lambda: converter.extract_image_filenames(page),
+        "gallery_html": lambda: converter._build_gallery_html(gallery),
+    }
+    return {
+        f"{name}.per_1k_links": [t * scale for t in _time(func, repeat)]
+        for name, func in benches.items()
+    }
+
+
+def long_table(rows: int, seed: int = 0) -> str:
+    """A table of inline ``||`` rows with attributes, colspans and rowspans."""
+
+    rnd = random.Random(seed)
+    lines = ['{| class="wikitable"', '! scope="col" | Датчик !! Поле !! Тип !! Описание', "|-"]
+    for i in range(rows):
+        if i % 10 == 0:
+            lines.append(f'| rowspan="2" | {_words(rnd, 1)} || colspan="2" | field_{i} || {_words(rnd, 3)}')
+        elif i % 10 == 1:
+            # The first column is covered by the rowspan above
+            lines.append(f"| field_{i} || int || {_words(rnd, 3)}")
+        else:
+            lines.append(f'| style="color:red" | {_words(rnd, 1)} || field_{i} || int || {_words(rnd, 3)}')
+        lines.append("|-")
+    lines.append("|}")
+    return "\n".join(lines) + "\n"
+
+
+def bench_tables(repeat: int, sizes: tuple[int, ...] = (1000, 10000)) -> dict[str, list[float]]:
+    """Per-row cost of convert_tables on tables of increasing length.
+
+    Times are reported per 1000 rows, so equal numbers across sizes mean
+    the table engine scales linearly.
+    """
+
+    timings = {}
+    for rows in sizes:
+        text = long_table(rows)
+        scale = 1000 / rows
+        timings[f"tables_{rows}_rows.per_1k_rows"] = [
+            t * scale for t in _time(lambda: converter.convert_tables(text), repeat)
+        ]
+    return timings
+
+
+# Templates of the datasheet pages: an infobox that calls a unit template
+DATASHEET_TEMPLATES = {
+    "Датчик": (
+        '{| class="wikitable"\n! Параметр !! Значение\n|-\n| Модель || {{{модель|?}}}\n'
+        "|-\n| Диапазон || {{{1}}}–{{{2}}} {{Ед|{{{тип|}}}}}\n"
+        "|-\n| Питание || {{#if:{{{питание|}}}|{{{питание}}} В|—}}\n|}"
+        "<noinclude>\n[[Категория:Шаблоны]]</noinclude>"
+    ),
+    "Ед": "{{#switch:{{{1}}}|ph=pH|ec=мСм/см|t|temp=°C|#default=}}",
+}
+
+
+def datasheet_pages(pages: int, calls: int = 20, seed: int = 0) -> list[str]:
+    """Pages calling the datasheet templates, with arguments that repeat across pages."""
+
+    rnd = random.Random(seed)
+    kinds = ("ph", "ec", "t", "temp", "")
+    result = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(calls):
+            lines.append(
+                f"{{{{Датчик|0|{rnd.choice((14, 100))}|модель={rnd.choice(_WORDS[:3])}"
+                f"|тип={rnd.choice(kinds)}|питание={rnd.choice(('', '3.3', '5'))}}}}}"
+            )
+            lines.append(_words(rnd, 8))
+        result.append("\n".join(lines) + "\n")
+    return result
+
+
+def bench_templates(repeat: int, pages: int = 50) -> dict[str, list[float]]:
+    """Per-call cost of template expansion on datasheet pages, with and without the cache.
+
+    Times are reported per 1000 template calls; every run starts with an
+    empty cache, so repeated arguments are only shared within the run.
+    """
+
+    texts = datasheet_pages(pages)
+    calls = sum(text.count("{{Датчик") for text in texts)
+    scale = 1000 / calls
+
+    def fetch(name: str) -> tuple[str, str] | None:
+        source = DATASHEET_TEMPLATES.get(name)
+        return None if source is None else ("1", source)
+
+    def expand(cache_size: int) -> None:
+        expander = wiki_templates.TemplateExpander(fetch, cache_size)
+        for text in texts:
+            expander.expand(text)
+
+    return {
+        f"templates_{name}.per_1k_calls": [t * scale for t in _time(lambda: expand(size), repeat)]
+        for name, size in (("cached", wiki_templates.CACHE_SIZE), ("uncached", 0))
+    }
+
+
+# What separates the tables of tables_page: nothing, a blank line, a gallery
+TABLE_SEPARATORS = {
+    "consecutive": "",
+    "blank_separated": "\n",
+    "gallery_separated": "<gallery>\nФайл:photo_{i}.jpg|{words}\n</gallery>\n",
+}
+
+
+def tables_page(tables: int, separator: str, seed: int = 0) -> str:
+    """A page of ``tables`` tables under a few headings, each followed by ``separator``."""
+
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(tables):
+        if i % 5 == 0:
+            parts.append(f"== Таблица {i} ==\n")
+        parts.append('{| class="wikitable"\n! Поле !! Значение\n')
+        for _ in range(20):
+            parts.append(f"|-\n| {_words(rnd, 2)} || {_words(rnd, 3)}\n")
+        parts.append("|}\n" + separator.format(i=i, words=_words(rnd, 2)))
+    return "".join(parts)
+
+
+def stream_peak_memory(sizes: tuple[int, ...] = (25, 400)) -> dict[str, int]:
+    """Peak bytes allocated by convert_lines on tables_page of each size and separator."""
+
+    peaks = {}
+    for name, separator in TABLE_SEPARATORS.items():
+        for tables in sizes:
+            lines = tables_page(tables, separator).splitlines(keepends=True)
+            tracemalloc.start()
+            try:
+                for _ in converter.convert_lines(lines):
+                    pass
+                peaks[f"stream_{name}_{tables}_tables"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return peaks
+
+
+def docs_corpus() -> dict[str, str]:
+    """The real docs/ pages, used as a baseline input for the converter."""
+
+    return {
+        md.stem: md.read_text(encoding="utf-8", errors="ignore")
+        for md in sorted(converter.DOCS_DIR.glob("*.md"))
+        if md.is_file()
+    }
+
+
+def _time(func: Callable[[], object], repeat: int) -> list[float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def bench_passes(corpus: dict[str, str], repeat: int) -> dict[str, list[float]]:
+    """Time each pass on the input it receives inside the legacy pipeline."""
+
+    inputs: dict[str, list[str]] = {name: [] for name, _ in PASSES}
+    for text in corpus.values():
+        for name, func in PASSES:
+            inputs[name].append(text)
+            text = func(text)
+
+    results = {}
+    for name, func in PASSES:
+        texts = inputs[name]
+        results[f"pass.{name}"] = _time(lambda: [func(t) for t in texts], repeat)
+    for engine in converter.ENGINES:
+        texts = list(corpus.values())
+        results[f"convert_text.{engine}"] = _time(
+            lambda: [converter.convert_text(t, engine) for t in texts], repeat
+        )
+    results["convert_page"] = _time(
+        lambda: [converter.convert_page(t) for t in texts], repeat
+    )
+    return results
+
+
+@contextlib.contextmanager
+def _patched(module: object, **values: object):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def bench_main(corpus: dict[str, str], repeat: int) -> dict[str, list[float]]:
+    """Time local-mode main() and check_file on a temporary copy of the tree.
+
+    All images referenced by the corpus are created in the temporary assets
+    directory first, so main() never goes to the network.
+    """
+
+    results: dict[str, list[float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        mediawiki_dir = root / "mediawiki"
+        docs_dir = root / "docs"
+        assets_dir = docs_dir / "assets"
+        mediawiki_dir.mkdir()
+        assets_dir.mkdir(parents=True)
+        for name, text in corpus.items():
+            (mediawiki_dir / f"{name}.mediawiki").write_text(text, encoding="utf-8")
+            for image in converter.convert_page(text).assets:
+                (assets_dir / image.replace(" ", "_")).touch()
+
+        with _patched(
+            converter,
+            ROOT=root,
+            MEDIAWIKI_DIR=mediawiki_dir,
+            DOCS_DIR=docs_dir,
+            ASSETS_DIR=assets_dir,
+            MANIFEST_FILE=root / ".cache" / "convert_manifest.json",
+            LINK_GRAPH_FILE=root / ".cache" / "link_graph.json",
+            IMAGE_VARIANTS_FILE=root / ".cache" / "image_variants.json",
+        ), contextlib.redirect_stdout(io.StringIO()):
+            results["main"] = _time(lambda: converter.main(["--force"]), repeat)
+            results["main.incremental"] = _time(lambda: converter.main([]), repeat)
+
+        results.update(bench_check_file(root, docs_dir, repeat))
+    return results
+
+
+def bench_check_file(root: Path, docs_dir: Path, repeat: int) -> dict[str, list[float]]:
+    md_files = sorted(p for p in docs_dir.rglob("*.md") if p.is_file())
+    with _patched(validate_docs, ROOT=root, DOCS_DIR=docs_dir):
+        return {
+            "check_file": _time(
+                lambda: [validate_docs.check_file(md) for md in md_files], repeat
+            ),
+            "check_file.indexed": _time(
+                lambda: [
+                    validate_docs.check_file(md, index)
+                    for index in [validate_docs.DocsIndex(docs_dir)]
+                    for md in md_files
+                ],
+                repeat,
+            ),
+        }
+
+
+def _summary(runs: list[float]) -> dict[str, object]:
+    return {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "runs": runs,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=converter.ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(sizes: list[str], repeat: int, pages: int) -> dict:
+    results: dict[str, dict[str, object]] = {}
+
+    print("Checking streamed conversion and image variants...", file=sys.stderr)
+    memory = stream_peak_memory()
+
+    corpora: dict[str, dict[str, str]] = {"docs": docs_corpus()}
+    for size in sizes:
+        corpora[f"synthetic.{size}"] = generate_corpus(size, pages)
+
+    for corpus_name, corpus in corpora.items():
+        print(f"Benchmarking {corpus_name} ({len(corpus)} pages)...", file=sys.stderr)
+        timings = bench_passes(corpus, repeat)
+        if corpus_name == "docs":
+            timings.update(
+                bench_check_file(converter.ROOT, converter.DOCS_DIR, repeat)
+            )
+        else:
+            timings.update(bench_main(corpus, repeat))
+        for metric, runs in timings.items():
+            results[f"{corpus_name}/{metric}"] = _summary(runs)
+
+    print("Benchmarking link microbenchmarks...", file=sys.stderr)
+    for metric, runs in bench_links(max(repeat, 5)).items():
+        results[f"micro/{metric}"] = _summary(runs)
+    print("Benchmarking table microbenchmarks...", file=sys.stderr)
+    for metric, runs in bench_tables(max(repeat, 5)).items():
+        results[f"micro/{metric}"] = _summary(runs)
+    print("Benchmarking template microbenchmarks...", file=sys.stderr)
+    for metric, runs in bench_templates(max(repeat, 5)).items():
+        results[f"micro/{metric}"] = _summary(runs)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "pages_per_kind": pages,
+        },
+        "results": results,
+        "memory": memory,
+    }
+
+
+def print_report(report: dict, baseline: dict | None = None) -> None:
+    rows = report["results"]
+    base_rows = baseline["results"] if baseline else {}
+    width = max(len(name) for name in rows)
+    header = f"{'benchmark':<{width}}  {'min, ms':>10}"
+    if baseline:
+        header += f"  {'before, ms':>10}  {'change':>8}"
+    print(header)
+    for name, row in rows.items():
+        line = f"{name:<{width}}  {row['min'] * 1000:>10.2f}"
+        before = base_rows.get(name)
+        if before:
+            ratio = row["min"] / before["min"] if before["min"] else float("inf")
+            line += f"  {before['min'] * 1000:>10.2f}  {(ratio - 1) * 100:>+7.1f}%"
+        print(line)
+
+    memory = report.get("memory", {})
+    base_memory = baseline.get("memory", {}) if baseline else {}
+    if memory:
+        print()
+        print(f"{'peak memory':<{width}}  {'KiB':>10}" + (f"  {'before':>10}" if baseline else ""))
+    for name, peak in memory.items():
+        line = f"{name:<{width}}  {peak / 1024:>10.1f}"
+        if name in base_memory:
+            line += f"  {base_memory[name] / 1024:>10.1f}"
+        print(line)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark converter passes, main() and validate_docs.check_file."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=SIZES,
+        default=["small", "medium"],
+        help="Synthetic corpus sizes to generate. Default: small medium.",
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=5,
+        help="Synthetic pages of each kind per corpus. Default: 5.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per benchmark; the minimum is reported. Default: 3.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write results as JSON to this file.",
+    )
+    parser.add_argument(
+        "--compare",
+        help="JSON results of an earlier run to compare against.",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+
+    report = run(args.sizes, max(1, args.repeat), max(1, args.pages))
+    print_report(report, baseline)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=1) + "\n", encoding="utf-8")
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,13 +11,46 @@ including headings, links, images, and galleries.
 from __future__ import annotations
 
 import argparse
+import ctypes
+import hashlib
+import http.client
+import json
+import os
+import posixpath
 import re
+import select
+import ssl
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, Mapping, TypeVar
 import urllib.parse
-import urllib.request
 import urllib.error
 
+import image_variants
+import validate_docs
+from wiki_patterns import (
+    CATEGORY_PATTERN,
+    EXT_LINK_PATTERN,
+    FILE_PREFIXES,
+    HEADING_PATTERN,
+    IMAGE_EXTENSIONS,
+    INT_LINK_PATTERN,
+    LIST_MARKERS,
+    QUOTES_PATTERN,
+    TABLE_SPAN_PATTERN,
+    VIDEO_EXTENSIONS,
+    file_extension,
+    is_file_link_target,
+)
+from wiki_templates import TemplateExpander, template_names
+
 ROOT = Path(__file__).resolve().parents[1]
 MEDIAWIKI_DIR = ROOT / "mediawiki"
 DOCS_DIR = ROOT / "docs"
@@ -25,12 +58,65 @@ ASSETS_DIR = DOCS_DIR / "assets"
 MEDIAWIKI_BASE_URL = "https://wiki.wega-project.ru/wiki/index.php"
 MEDIAWIKI_FILE_URL = "https://wiki.wega-project.ru/wiki/images"
 DEFAULT_PAGES_FILE = ROOT / "all_pages.txt"
+MANIFEST_FILE = ROOT / ".cache" / "convert_manifest.json"
+SYNC_STATE_FILE = ROOT / ".cache" / "remote_sync.json"
+LINK_GRAPH_FILE = ROOT / ".cache" / "link_graph.json"
+# {duplicate file name: canonical file name} of assets stored once, in ASSETS_DIR
+ASSET_ALIASES_NAME = ".aliases.json"
+IMAGE_VARIANTS_FILE = ROOT / ".cache" / "image_variants.json"
+HTTP_CACHE_DIR = ROOT / ".cache" / "http"
+# Namespace of template pages; locally Шаблон:Name is mediawiki/Шаблон_Name.mediawiki
+TEMPLATE_NAMESPACE = "Шаблон"
+WATCH_POLL_INTERVAL = 0.2  # seconds between scans of mediawiki/ without inotify
+WATCH_SETTLE = 0.05  # seconds to wait for the other events of a save
+# Largest table cell spans honoured, as in MediaWiki's sanitizer
+MAX_COLSPAN = 1000
+MAX_ROWSPAN = 65534
 INVALID_FILENAME_CHARS = '/<>:"|?*'
+_FILENAME_TRANSLATION = str.maketrans(dict.fromkeys(" " + INVALID_FILENAME_CHARS, "_"))
+MAX_REQUESTS_PER_HOST = 4
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Local sources larger than this are converted from their file piece by
+# piece (see convert_file_streaming) unless they have templates to expand
+STREAM_THRESHOLD = 4 * 1024 * 1024  # bytes
+# Number of titles the MediaWiki API accepts in one `titles=A|B|C` query
+API_TITLES_LIMIT = 50
+# The scripts whose code decides the Markdown written, see converter_version
+CONVERTER_SOURCES = ("convert_mediawiki_to_md.py", "wiki_patterns.py", "wiki_templates.py")
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+class _PageRefs:
+    """What a page refers to, collected by the passes while they convert it.
+
+    Every attribute maps names to None, so they keep the order of first use.
+    """
 
+    def __init__(self) -> None:
+        self.assets: dict[str, None] = {}
+        self.links: dict[str, None] = {}
+        self.external_urls: dict[str, None] = {}
+        self.categories: dict[str, None] = {}
 
-_HEADING_PATTERN = re.compile(r"^(={1,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
-_EXT_LINK_PATTERN = re.compile(r"\[(https?://[^\s\]]+)(?:\s+([^\]]+))?\]")
-_INT_LINK_PATTERN = re.compile(r"\[\[([^|\]]+)(?:\|([^\]]+))?\]\]")
+
+@dataclass
+class ConversionResult:
+    """Markdown of a page plus what it refers to, see :func:`convert_page`.
+
+    Lists hold every name once, in order of first use. ``assets`` are file
+    names as written in the source (the names download_image takes), and
+    ``links`` are titles of internal pages.
+    """
+
+    markdown: str
+    assets: list[str] = field(default_factory=list)
+    links: list[str] = field(default_factory=list)
+    external_urls: list[str] = field(default_factory=list)
+    categories: list[str] = field(default_factory=list)
 
 
 def sanitize_title_to_filename(title: str) -> str:
@@ -41,114 +127,232 @@ def sanitize_title_to_filename(title: str) -> str:
     - Characters / < > : " | ? * are replaced with underscores.
     """
 
-    base = title.replace(" ", "_")
-    for ch in INVALID_FILENAME_CHARS:
-        base = base.replace(ch, "_")
-    return base
+    return title.translate(_FILENAME_TRANSLATION)
+
+
+def page_href(title: str) -> str:
+    """Markdown link target of the page ``title``, relative to docs/."""
+
+    # Same sanitization rules as for output filenames, so links match files.
+    return f"{sanitize_title_to_filename(title)}.md"
+
+
+def asset_href(filename: str) -> str:
+    """Markdown link target of the file ``filename``, relative to docs/."""
+
+    # MediaWiki replaces spaces with underscores in actual files
+    return f"assets/{filename.replace(' ', '_')}"
+
+
+def _heading_repl(match: re.Match[str]) -> str:
+    equals = match.group(1)
+    title = match.group(2).strip()
+    hashes = "#" * len(equals)
+    return f"{hashes} {title}"
 
 
 def convert_headings(text: str) -> str:
     """Convert MediaWiki headings (= H1 =, == H2 ==) to Markdown (# H1, ## H2)."""
 
-    def _repl(match: re.Match[str]) -> str:
-        equals = match.group(1)
-        title = match.group(2).strip()
-        hashes = "#" * len(equals)
-        return f"{hashes} {title}"
-
-    return _HEADING_PATTERN.sub(_repl, text)
+    return HEADING_PATTERN.sub(_heading_repl, text)
 
 
 def convert_emphasis(text: str) -> str:
     """Convert '''bold''' and ''italic'' to Markdown **bold** / *italic*.
 
-    Order matters: bold+italic → bold → italic.
+    Every line is parsed on its own, as MediaWiki does: its apostrophe runs
+    toggle bold and italic in one scan and whatever is still open at the
+    end of the line is closed there, so an unbalanced '' never reaches
+    past it.
     """
 
-    # bold+italic: '''''text'''''
-    text = re.sub(r"'''''(.*?)'''''", r"***\1***", text, flags=re.DOTALL)
-    # bold: '''text'''
-    text = re.sub(r"'''(.*?)'''", r"**\1**", text, flags=re.DOTALL)
-    # italic: ''text''
-    text = re.sub(r"''(.*?)''", r"*\1*", text, flags=re.DOTALL)
-    return text
+    if "''" not in text:
+        return text
+    return "\n".join(
+        _line_emphasis(line) if "''" in line else line for line in text.split("\n")
+    )
+
+
+_ITALIC = "*"
+_BOLD = "**"
+# Open emphasis: "" none, "i" or "b", "bi" or "ib" in opening order. For
+# (open, apostrophe run) the delimiters written and what is open after,
+# following MediaWiki's doQuotes
+_QUOTE_TRANSITIONS = {
+    ("", 2): (_ITALIC, "i"),
+    ("i", 2): (_ITALIC, ""),
+    ("b", 2): (_ITALIC, "bi"),
+    ("bi", 2): (_ITALIC, "b"),
+    ("ib", 2): (_BOLD + _ITALIC + _BOLD, "b"),
+    ("", 3): (_BOLD, "b"),
+    ("b", 3): (_BOLD, ""),
+    ("i", 3): (_BOLD, "ib"),
+    ("bi", 3): (_ITALIC + _BOLD + _ITALIC, "i"),
+    ("ib", 3): (_BOLD, "i"),
+    ("b", 5): (_BOLD + _ITALIC, "i"),
+    ("i", 5): (_ITALIC + _BOLD, "b"),
+    ("bi", 5): (_ITALIC + _BOLD, ""),
+    ("ib", 5): (_BOLD + _ITALIC, ""),
+}
+# ''''' with nothing open leaves the order open until the next run, which
+# decides it: (delimiters before the text in between, after it, open after)
+_QUOTE_BOTH_RESOLVED = {
+    2: (_BOLD + _ITALIC, _ITALIC, "b"),
+    3: (_ITALIC + _BOLD, _BOLD, "i"),
+    5: (_ITALIC + _BOLD, _BOLD + _ITALIC, ""),
+}
+# Delimiters closing what is still open at the end of a line
+_QUOTE_CLOSERS = {"": "", "i": _ITALIC, "b": _BOLD, "bi": _ITALIC + _BOLD, "ib": _BOLD + _ITALIC}
+
+
+def _line_emphasis(line: str) -> str:
+    """MediaWiki's doQuotes for one line, writing Markdown delimiters."""
+
+    # Text and apostrophe runs alternate, text first
+    parts = QUOTES_PATTERN.split(line)
+    italic_runs = bold_runs = 0
+    for i in range(1, len(parts), 2):
+        quotes = len(parts[i])
+        if quotes == 4:
+            # ''''bold''' is an apostrophe, then bold
+            parts[i - 1] += "'"
+            parts[i] = "'''"
+            quotes = 3
+        elif quotes > 5:
+            # Apostrophes before a bold italic run are text
+            parts[i - 1] += "'" * (quotes - 5)
+            parts[i] = "'''''"
+            quotes = 5
+        if quotes != 3:
+            italic_runs += 1
+        if quotes != 2:
+            bold_runs += 1
+
+    if italic_runs % 2 and bold_runs % 2:
+        # One ''' is an apostrophe and italics: preferably after a one-letter
+        # word (l'''amour''), else after a longer word, else after a space
+        single_letter = multi_letter = space = -1
+        for i in range(1, len(parts), 2):
+            if len(parts[i]) != 3:
+                continue
+            before = parts[i - 1]
+            if before[-1:] == " ":
+                if space < 0:
+                    space = i
+            elif before[-2:-1] == " ":
+                single_letter = i
+                break
+            elif multi_letter < 0:
+                multi_letter = i
+        if single_letter > -1:
+            split = single_letter
+        else:
+            split = multi_letter if multi_letter > -1 else space
+        if split > -1:
+            parts[split - 1] += "'"
+            parts[split] = "''"
+
+    out = [parts[0]]
+    state = ""
+    for i in range(1, len(parts), 2):
+        quotes = len(parts[i])
+        if state == "both":
+            before, after, state = _QUOTE_BOTH_RESOLVED[quotes]
+            out.append(before + parts[i - 1] + after)
+        elif quotes == 5 and not state:
+            # The text up to the next run is held back until it is known
+            state = "both"
+        else:
+            delimiters, state = _QUOTE_TRANSITIONS[state, quotes]
+            out.append(delimiters)
+        if state != "both":
+            out.append(parts[i + 1])
+
+    # Close whatever is still open at the end of the line
+    if state != "both":
+        out.append(_QUOTE_CLOSERS[state])
+    elif parts[-1]:
+        out.append(_BOLD + _ITALIC + parts[-1] + _ITALIC + _BOLD)
+    return "".join(out)
 
 
-def convert_external_links(text: str) -> str:
+def convert_external_links(text: str, refs: _PageRefs | None = None) -> str:
     """Convert [https://example.com Label] to [Label](https://example.com).
 
     Bare URLs (https://...) are left as-is and will usually render as links.
     """
 
-    def _repl(match: re.Match[str]) -> str:
-        url = match.group(1).strip()
-        label = (match.group(2) or "").strip() or url
-        return f"[{label}]({url})"
-
-    return _EXT_LINK_PATTERN.sub(_repl, text)
+    if refs is None:
+        return EXT_LINK_PATTERN.sub(_external_link_repl, text)
+    return EXT_LINK_PATTERN.sub(lambda match: _external_link_repl(match, refs), text)
 
 
-def _is_file_link_target(target: str) -> bool:
-    lower = target.lower()
-    # Handle both [[Файл:...]] and [[:Файл:...]] (with leading colon)
-    return lower.startswith("файл:") or lower.startswith("file:") or lower.startswith(":файл:") or lower.startswith(":file:")
+def _external_link_repl(match: re.Match[str], refs: _PageRefs | None = None) -> str:
+    url = match.group(1).strip()
+    label = (match.group(2) or "").strip() or url
+    if refs is not None:
+        refs.external_urls[url] = None
+    return f"[{label}]({url})"
 
 
-def convert_internal_links(text: str) -> str:
+def convert_internal_links(text: str, refs: _PageRefs | None = None) -> str:
     """Convert [[Page]] / [[Page|Label]] and [[Файл:img.png|...]]."""
 
-    def _repl(match: re.Match[str]) -> str:
-        target = match.group(1).strip()
-        label = (match.group(2) or "").strip()
+    if refs is None:
+        return INT_LINK_PATTERN.sub(_internal_link_repl, text)
+    return INT_LINK_PATTERN.sub(lambda match: _internal_link_repl(match, refs), text)
 
-        # File / image links
-        if _is_file_link_target(target):
-            # Remove leading colon if present (for [[:Файл:...]])
-            clean_target = target.lstrip(':')
-            rest = clean_target.split(":", 1)[1].strip() if ":" in clean_target else clean_target
-            filename = rest.strip()
-            
-            # Normalize filename - MediaWiki replaces spaces with underscores
-            normalized_filename = filename.replace(' ', '_')
-
-            alt_text = ""
-            if label:
-                # label can contain options separated by '|', use last part as caption
-                parts = [p.strip() for p in label.split("|") if p.strip()]
-                if parts:
-                    alt_text = parts[-1]
-            if not alt_text:
-                alt_text = filename
-
-            # Check file type
-            video_extensions = ('.mp4', '.webm', '.ogg', '.mov', '.avi')
-            image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.bmp')
-            
-            lower_filename = normalized_filename.lower()
-            
-            if any(lower_filename.endswith(ext) for ext in video_extensions):
-                # Use HTML5 video tag for videos
-                return f'<video controls width="100%"><source src="assets/{normalized_filename}" type="video/mp4">Your browser does not support the video tag.</video>'
-            elif any(lower_filename.endswith(ext) for ext in image_extensions):
-                # Use markdown image syntax for images
-                return f"![{alt_text}](assets/{normalized_filename})"
-            else:
-                # For other files (zip, pdf, etc), create download link
-                return f"[{alt_text}](assets/{normalized_filename})"
 
-        # Normal internal page links
-        page_name = target
-        if not label:
-            label = page_name
-        # Use same sanitization rules as for output filenames, so links match files.
-        filename_base = sanitize_title_to_filename(page_name)
-        href = f"{filename_base}.md"
-        return f"[{label}]({href})"
+def _internal_link_repl(match: re.Match[str], refs: _PageRefs | None = None) -> str:
+    target = match.group(1).strip()
+    label = (match.group(2) or "").strip()
+
+    # File / image links
+    if is_file_link_target(target):
+        # Remove leading colon if present (for [[:Файл:...]])
+        clean_target = target.lstrip(':')
+        rest = clean_target.split(":", 1)[1].strip() if ":" in clean_target else clean_target
+        filename = rest.strip()
+        if refs is not None:
+            refs.assets[filename] = None
+        
+        # Normalize filename - MediaWiki replaces spaces with underscores
+        normalized_filename = filename.replace(' ', '_')
+
+        alt_text = ""
+        if label:
+            # label can contain options separated by '|', use last part as caption
+            parts = [p.strip() for p in label.split("|") if p.strip()]
+            if parts:
+                alt_text = parts[-1]
+        if not alt_text:
+            alt_text = filename
+
+        # Check file type
+        extension = file_extension(normalized_filename)
+        
+        if extension in VIDEO_EXTENSIONS:
+            # Use HTML5 video tag for videos
+            # Only metadata is loaded up front; the poster is added by finalize_markdown
+            return f'<video controls preload="metadata" width="100%"><source src="assets/{normalized_filename}" type="video/mp4">Your browser does not support the video tag.</video>'
+        elif extension in IMAGE_EXTENSIONS:
+            # Use markdown image syntax for images, lazy-loaded through attr_list;
+            # finalize_markdown adds the intrinsic size
+            return f"![{alt_text}](assets/{normalized_filename}){{ loading=lazy decoding=async }}"
+        else:
+            # For other files (zip, pdf, etc), create download link
+            return f"[{alt_text}](assets/{normalized_filename})"
 
-    return _INT_LINK_PATTERN.sub(_repl, text)
+    # Normal internal page links
+    page_name = target
+    if refs is not None:
+        refs.links[page_name] = None
+    if not label:
+        label = page_name
+    return f"[{label}]({page_href(page_name)})"
 
 
-def _build_gallery_html(lines: Iterable[str]) -> str:
+def _build_gallery_html(lines: Iterable[str], refs: _PageRefs | None = None) -> str:
     """Build gallery with HTML wrapper for glightbox.
 
     Each line is expected to be in one of forms:
@@ -164,8 +368,7 @@ def _build_gallery_html(lines: Iterable[str]) -> str:
             continue
         
         # Check if line starts with file marker (case insensitive)
-        lower_line = line.lower()
-        if not (lower_line.startswith("файл:") or lower_line.startswith("file:")):
+        if not line.lower().startswith(FILE_PREFIXES):
             continue
         
         # Find the colon position
@@ -184,6 +387,8 @@ def _build_gallery_html(lines: Iterable[str]) -> str:
     if not images:
         # Fallback: just join original lines if we couldn't parse anything useful
         return "\n".join(lines)
+    if refs is not None:
+        refs.assets.update(dict.fromkeys(filename for filename, _caption in images))
 
     # Build HTML gallery with glightbox data attributes
     out: list[str] = []
@@ -196,7 +401,7 @@ def _build_gallery_html(lines: Iterable[str]) -> str:
         alt = caption or filename
         # Add data-gallery attribute to group images
         out.append(f'<a href="assets/{normalized_filename}" data-gallery="gallery" data-caption="{alt}">')
-        out.append(f'  <img src="assets/{normalized_filename}" alt="{alt}" width="200" />')
+        out.append(f'  <img src="assets/{normalized_filename}" alt="{alt}" width="200" loading="lazy" decoding="async" />')
         out.append('</a>')
     
     out.append('')
@@ -205,18 +410,41 @@ def _build_gallery_html(lines: Iterable[str]) -> str:
     return "\n".join(out)
 
 
-def convert_galleries(text: str) -> str:
+def convert_galleries(text: str, refs: _PageRefs | None = None) -> str:
     """Convert <gallery>...</gallery> blocks to markdown images."""
 
-    lines = text.splitlines()
     out_lines: list[str] = []
-    in_gallery = False
-    gallery_lines: list[str] = []
+    galleries = _GalleryParser(refs)
+    for line in text.splitlines():
+        galleries.feed(line, out_lines)
+    galleries.close(out_lines)
+
+    # Preserve trailing newline if it was present
+    result = "\n".join(out_lines)
+    if text.endswith("\n"):
+        result += "\n"
+    return result
 
-    for line in lines:
-        stripped = line.strip()
 
-        if not in_gallery:
+class _GalleryParser:
+    """Line-by-line state machine behind :func:`convert_galleries`.
+
+    Output lines are appended to the list passed to :meth:`feed`; a rendered
+    gallery is appended line by line.
+    """
+
+    def __init__(self, refs: _PageRefs | None = None) -> None:
+        self.in_gallery = False
+        self.gallery_lines: list[str] = []
+        self.refs = refs
+
+    def _emit_gallery(self, out_lines: list[str]) -> None:
+        out_lines.extend(_build_gallery_html(self.gallery_lines, self.refs).split("\n"))
+        self.in_gallery = False
+        self.gallery_lines = []
+
+    def feed(self, line: str, out_lines: list[str]) -> None:
+        if not self.in_gallery:
             # Check if <gallery> tag is on this line
             if "<gallery" in line:
                 # Split line at <gallery> tag
@@ -224,8 +452,8 @@ def convert_galleries(text: str) -> str:
                 if before_gallery.strip():
                     out_lines.append(before_gallery.rstrip())
                 
-                in_gallery = True
-                gallery_lines = []
+                self.in_gallery = True
+                self.gallery_lines = []
                 
                 # Check if there's content after <gallery> on same line
                 gallery_start = line.find(">", line.find("<gallery"))
@@ -235,316 +463,1098 @@ def convert_galleries(text: str) -> str:
                         # Gallery opens and closes on same line
                         gallery_content, after_gallery = after_tag.split("</gallery>", 1)
                         if gallery_content.strip():
-                            gallery_lines.append(gallery_content)
-                        out_lines.append(_build_gallery_html(gallery_lines))
-                        in_gallery = False
-                        gallery_lines = []
+                            self.gallery_lines.append(gallery_content)
+                        self._emit_gallery(out_lines)
                         if after_gallery.strip():
                             out_lines.append(after_gallery.lstrip())
                     elif after_tag.strip():
-                        gallery_lines.append(after_tag)
-                continue
+                        self.gallery_lines.append(after_tag)
+                return
             out_lines.append(line)
-            continue
+            return
 
         # Inside gallery
         if "</gallery>" in line:
             before, after = line.split("</gallery>", 1)
             if before.strip():
-                gallery_lines.append(before)
-            out_lines.append(_build_gallery_html(gallery_lines))
-            in_gallery = False
-            gallery_lines = []
+                self.gallery_lines.append(before)
+            self._emit_gallery(out_lines)
             if after.strip():
                 out_lines.append(after)
-            continue
-
-        gallery_lines.append(line)
+            return
 
-    if in_gallery:
-        # Unclosed gallery; try to render what we have
-        out_lines.append(_build_gallery_html(gallery_lines))
+        self.gallery_lines.append(line)
 
-    # Preserve trailing newline if it was present
-    result = "\n".join(out_lines)
-    if text.endswith("\n"):
-        result += "\n"
-    return result
+    def close(self, out_lines: list[str]) -> None:
+        if self.in_gallery:
+            # Unclosed gallery; try to render what we have
+            self._emit_gallery(out_lines)
 
 
 def convert_tables(text: str) -> str:
     """Convert MediaWiki tables {| ... |} to Markdown tables."""
 
-    lines = text.splitlines()
     out_lines: list[str] = []
-    in_table = False
-    table_rows: list[list[str]] = []
-    header_row: list[str] = []
-    current_row: list[str] = []
-    in_header = False
-    
+    lines = iter(text.splitlines())
     for line in lines:
-        stripped = line.strip()
-        
-        if not in_table:
-            # Check for table start
-            if stripped.startswith("{|"):
-                in_table = True
-                table_rows = []
-                header_row = []
-                current_row = []
-                in_header = False
-                continue
+        # Check for table start
+        if line.strip().startswith("{|"):
+            _read_table(lines, out_lines)
+        else:
             out_lines.append(line)
-            continue
-        
-        # Inside table
-        if stripped.startswith("|}"):
-            # End of table - convert to markdown
-            if current_row:
-                if in_header:
-                    header_row.extend(current_row)
-                else:
-                    table_rows.append(current_row)
-            
-            if header_row or table_rows:
-                # Build markdown table
-                md_table = _build_markdown_table(header_row, table_rows)
-                out_lines.extend(md_table)
-            
-            in_table = False
-            header_row = []
-            table_rows = []
-            current_row = []
-            in_header = False
-            continue
-        
-        # Skip table attributes and caption
-        if stripped.startswith("|+") or (stripped.startswith("class=") and "=" in stripped) or not stripped:
-            continue
-        
-        # Header cells
-        if stripped.startswith("!"):
-            # If we were building a data row, save it first
-            if current_row and not in_header:
-                table_rows.append(current_row)
-                current_row = []
-            
-            in_header = True
-            # Remove leading ! and add to header - keep empty cells
-            cell_content = stripped[1:].strip()
-            current_row.append(cell_content)
-            continue
-        
-        # Row separator
-        if stripped.startswith("|-"):
-            # Save current row
-            if current_row:
-                if in_header:
-                    header_row.extend(current_row)
-                    in_header = False
-                else:
-                    table_rows.append(current_row)
-                current_row = []
-            continue
-        
-        # Data cell
-        if stripped.startswith("|") and not stripped.startswith("|}"):
-            # If we were in header mode, switch to data mode
-            if in_header and current_row:
-                header_row.extend(current_row)
-                current_row = []
-                in_header = False
-            
-            # Remove leading | - keep empty cells as empty strings
-            cell_content = stripped[1:].strip()
-            current_row.append(cell_content)
-            continue
-    
-    # Handle unclosed table
-    if in_table:
-        if current_row:
-            if in_header:
-                header_row.extend(current_row)
-            else:
-                table_rows.append(current_row)
-        if header_row or table_rows:
-            md_table = _build_markdown_table(header_row, table_rows)
-            out_lines.extend(md_table)
-    
+
     result = "\n".join(out_lines)
     if text.endswith("\n"):
         result += "\n"
     return result
 
 
-def _build_markdown_table(header: list[str], rows: list[list[str]]) -> list[str]:
-    """Build a markdown table from header and rows."""
-    
-    if not header and not rows:
-        return []
-    
-    # If no explicit header, use first row as header
-    if not header and rows:
-        header = rows[0]
-        rows = rows[1:]
-    
-    # Determine number of columns
-    max_cols = len(header) if header else max((len(r) for r in rows), default=0)
-    
-    if max_cols == 0:
-        return []
-    
-    # Normalize header
-    if len(header) < max_cols:
-        header.extend([""] * (max_cols - len(header)))
-    elif len(header) > max_cols:
-        header = header[:max_cols]
-    
-    # Normalize rows
-    normalized_rows = []
-    for row in rows:
-        if len(row) < max_cols:
-            row = row + [""] * (max_cols - len(row))
-        elif len(row) > max_cols:
-            row = row[:max_cols]
-        normalized_rows.append(row)
-    
-    # Build markdown
-    result = []
-    
-    # Add blank line before table for proper markdown rendering
-    result.append("")
-    
-    # Header
-    result.append("| " + " | ".join(header) + " |")
-    
-    # Separator
-    result.append("| " + " | ".join(["---"] * max_cols) + " |")
-    
-    # Rows
-    for row in normalized_rows:
-        result.append("| " + " | ".join(row) + " |")
-    
-    # Add blank line after table
-    result.append("")
-    
-    return result
+def _read_table(lines: Iterator[str], out_lines: list[str]) -> None:
+    """Consume one table up to its closing |} and append it as Markdown.
 
+    ``lines`` must be positioned right after the {| line. An unclosed table
+    runs to the end of the input. Cells may be given one per line or
+    inline (``| a || b``, ``! a !! b``), with attributes before a single
+    ``|``; a line that starts no cell continues the last one. The first
+    row becomes the Markdown header and sets the column count.
+    """
+
+    table = _TableLayout(out_lines)
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        marker = stripped[0]
+        if marker == "|":
+            if stripped.startswith("|}"):
+                break
+            if stripped.startswith("|-"):
+                # Row attributes are dropped with the separator
+                table.end_row()
+            elif not stripped.startswith("|+"):
+                # Captions have no Markdown equivalent
+                for cell in stripped[1:].split("||"):
+                    table.add_cell(cell)
+        elif marker == "!":
+            # Header lines separate their cells with !! as well as ||
+            for cell in stripped[1:].replace("!!", "||").split("||"):
+                table.add_cell(cell)
+        else:
+            table.continue_cell(stripped)
+    table.close()
 
-def remove_category_links(text: str) -> str:
+
+class _TableLayout:
+    """Place the cells of one table in columns and write its rows.
+
+    Rows are written as soon as they end, so a table is laid out in one
+    pass over its cells. A colspan is filled with empty cells to its
+    right, a rowspan with empty cells in the rows below; Markdown has no
+    spans of its own. The row being built is the only one kept.
+    """
+
+    def __init__(self, out_lines: list[str]) -> None:
+        self.out_lines = out_lines
+        self.columns = 0  # Set by the header row
+        self.row: list[str] = []
+        self.last_cell = -1  # Index in row of the last cell given in the source
+        # Per column, rows below still covered by a rowspan from above
+        self.covered: list[int] = []
+
+    def _fill_covered(self) -> None:
+        row, covered = self.row, self.covered
+        while len(row) < len(covered) and covered[len(row)]:
+            covered[len(row)] -= 1
+            row.append("")
+
+    def add_cell(self, cell: str) -> None:
+        attributes, bar, content = cell.partition("|")
+        # A bar inside a link or template is not the attribute separator
+        if not bar or "[[" in attributes or "{{" in attributes:
+            attributes, content = "", cell
+        colspan = rowspan = 1
+        if "span" in attributes:
+            for name, value in TABLE_SPAN_PATTERN.findall(attributes):
+                if name.lower() == "colspan":
+                    colspan = min(max(int(value), 1), MAX_COLSPAN)
+                else:
+                    rowspan = min(max(int(value), 1), MAX_ROWSPAN)
+
+        self._fill_covered()
+        row, covered = self.row, self.covered
+        if self.columns:
+            # Cells past the header's width are cut anyway
+            colspan = max(min(colspan, self.columns - len(row)), 1)
+        self.last_cell = len(row)
+        row.append(content.strip())
+        if colspan > 1:
+            row.extend([""] * (colspan - 1))
+        if rowspan > 1:
+            if len(covered) < len(row):
+                covered.extend([0] * (len(row) - len(covered)))
+            for column in range(self.last_cell, len(row)):
+                covered[column] = rowspan - 1
+
+    def continue_cell(self, text: str) -> None:
+        # Lines before the first cell of a row continue the {| or |-
+        # attributes and are dropped with them
+        if self.row:
+            self.row[self.last_cell] += "<br>" + text
+
+    def end_row(self) -> None:
+        row = self.row
+        if not row:
+            # An empty row leaves the rowspans above it untouched
+            return
+        covered = self.covered
+        for column in range(len(row), len(covered)):
+            if covered[column]:
+                covered[column] -= 1
+                if len(row) < column:
+                    row.extend([""] * (column - len(row)))
+                row.append("")
+
+        out_lines = self.out_lines
+        if not self.columns:
+            self.columns = len(row)
+            # Blank line before the table for proper Markdown rendering
+            out_lines.append("")
+            out_lines.append("| " + " | ".join(row) + " |")
+            out_lines.append("| " + " | ".join(["---"] * self.columns) + " |")
+        else:
+            if len(row) < self.columns:
+                row.extend([""] * (self.columns - len(row)))
+            elif len(row) > self.columns:
+                del row[self.columns:]
+            out_lines.append("| " + " | ".join(row) + " |")
+        row.clear()
+        self.last_cell = -1
+
+    def close(self) -> None:
+        self.end_row()
+        if self.columns:
+            self.out_lines.append("")
+
+
+def remove_category_links(text: str, refs: _PageRefs | None = None) -> str:
     """Remove MediaWiki category links [[Категория:...]] or [[Category:...]]."""
     
+    if refs is not None:
+        # [[Категория:Name|sort key]]
+        for category in CATEGORY_PATTERN.findall(text):
+            refs.categories[category.split("|", 1)[0].strip()] = None
     # Remove category links
-    text = re.sub(r'\[\[(?:Категория|Category|категория|category):([^\]]+)\]\]', '', text, flags=re.IGNORECASE)
+    text = CATEGORY_PATTERN.sub('', text)
     return text
 
 
 def convert_lists(text: str) -> str:
-    """Convert MediaWiki lists (* and #) to Markdown lists."""
+    """Convert MediaWiki lists (*, #, ; and :) to Markdown lists."""
     
-    lines = text.splitlines()
-    result = []
-    in_list = False
-    list_counters = {}  # Track counters for each depth level
-    
-    for i, line in enumerate(lines):
-        # Skip if line is already a markdown heading (starts with # followed by space)
-        if line.startswith('#') and len(line) > 1 and line[1] == ' ':
-            in_list = False
-            list_counters = {}
-            result.append(line)
-            continue
-        
-        # Check if line starts with list markers
-        is_list_item = line.startswith('*') or (line.startswith('#') and (len(line) < 2 or line[1] != ' '))
-        
-        if is_list_item:
-            # Add blank line before list if previous line was not empty and not a list
-            if not in_list and result and result[-1].strip():
-                result.append('')
-            
-            in_list = True
-            
-            # Parse mixed lists like *# or *##
-            markers = []
-            idx = 0
-            while idx < len(line) and line[idx] in '*#':
-                markers.append(line[idx])
-                idx += 1
-            
-            content = line[idx:].strip()
-            
-            # For mixed lists like *#, treat as ordered list at same level
-            # Count only the actual nesting depth (not the container marker)
-            if len(markers) >= 2 and markers[0] == '*' and markers[1] == '#':
-                # *# is ordered list, depth is based on # count
-                hash_count = markers.count('#')
-                depth = hash_count - 1
-                indent = '  ' * depth
-                
-                # Increment counter for this depth
-                if depth not in list_counters:
-                    list_counters[depth] = 1
-                else:
-                    list_counters[depth] += 1
-                
-                # Reset deeper level counters
-                keys_to_remove = [k for k in list_counters if k > depth]
-                for k in keys_to_remove:
-                    del list_counters[k]
-                
-                result.append(f"{indent}{list_counters[depth]}. {content}")
-            else:
-                # Normal list - depth based on total markers
-                depth = len(markers) - 1
-                indent = '  ' * depth
-                
-                # Use the last marker to determine list type
-                if markers[-1] == '*':
-                    result.append(f"{indent}- {content}")
-                else:
-                    # Increment counter for this depth
-                    if depth not in list_counters:
-                        list_counters[depth] = 1
-                    else:
-                        list_counters[depth] += 1
-                    
-                    # Reset deeper level counters
-                    keys_to_remove = [k for k in list_counters if k > depth]
-                    for k in keys_to_remove:
-                        del list_counters[k]
-                    
-                    result.append(f"{indent}{list_counters[depth]}. {content}")
+    result: list[str] = []
+    lists = _ListParser()
+    for line in text.splitlines():
+        lists.feed(line, result)
+    return '\n'.join(result)
+
+
+def _split_definition(text: str) -> tuple[str, str | None]:
+    """Split ``term : definition`` at the first colon outside links and tags."""
+
+    depth = 0
+    for i, char in enumerate(text):
+        if char in "[<":
+            depth += 1
+        elif char in "]>":
+            depth = max(depth - 1, 0)
+        elif char == ":" and not depth and not text.startswith("//", i + 1):
+            return text[:i].strip(), text[i + 1:].strip()
+    return text.strip(), None
+
+
+class _ListParser:
+    """Line-by-line state machine behind :func:`convert_lists`.
+
+    The open * and # lists are kept on a stack, outermost first, with the
+    last number given in each. An item pops the lists its markers no
+    longer match and pushes the new ones, so every list level is opened
+    and closed once and numbering restarts in a list opened anew. A list
+    line ending in : continues the open item (``#:``) without numbering
+    it. ; terms and the : lines after them become a ``def_list``
+    definition list; other : lines are indents, rendered as block quotes.
+    """
+
+    def __init__(self) -> None:
+        self.in_list = False
+        self.markers = ""  # "*" or "#" per open list
+        self.numbers: list[int] = []  # Last item number per open list
+        self.columns: list[int] = []  # Content column of the last item per open list
+        self.block: str | None = None  # "list", "definitions" or "quote"
+        self.previous: str | None = None  # Last line emitted
+
+    def _emit(self, line: str, result: list[str]) -> None:
+        self.previous = line
+        result.append(line)
+
+    def _reset(self) -> None:
+        self.in_list = False
+        self.block = None
+        self.markers = ""
+        self.numbers.clear()
+        self.columns.clear()
+
+    def _open(self, list_markers: str) -> None:
+        """Make ``list_markers`` the open lists, keeping their common prefix."""
+
+        markers = self.markers
+        if list_markers == markers:
+            return
+        if list_markers.startswith(markers):
+            common = len(markers)
         else:
+            common = 0
+            for open_marker, marker in zip(markers, list_markers):
+                if open_marker != marker:
+                    break
+                common += 1
+            del self.numbers[common:], self.columns[common:]
+        for level in range(common, len(list_markers)):
+            self.numbers.append(0)
+            self.columns.append(2 * level + 2)
+        self.markers = list_markers
+
+    def feed(self, line: str, result: list[str]) -> None:
+        idx = len(line) - len(line.lstrip('*#;:'))
+        if not idx:
             # Add blank line after list if next line is not empty and not a list
-            if in_list and line.strip():
-                result.append('')
-            in_list = False
-            list_counters = {}
-            result.append(line)
-    
-    return '\n'.join(result)
+            if self.in_list and line.strip():
+                self._emit('', result)
+            self._reset()
+            self._emit(line, result)
+            return
+
+        prefix = line[:idx]
+        content = line[idx:].strip()
+        last = prefix[-1]
+        list_markers = prefix.replace(':', '').replace(';', '')
+        if last in '*#':
+            block = 'list'
+        elif last == ':' and list_markers and prefix[0] in '*#':
+            block = 'list'  # Continuation of an item, e.g. #:
+        elif last == ';' or self.block == 'definitions' or ';' in prefix:
+            block = 'definitions'
+        else:
+            block = 'quote'
+
+        # Add blank line before list if previous line was not empty and not a
+        # list, and between different kinds of blocks
+        separate = False
+        if self.in_list:
+            if block != self.block:
+                separate = True
+                self._reset()
+        elif self.previous is not None and self.previous.strip():
+            separate = True
+        self.in_list = True
+        self.block = block
+
+        if separate:
+            self._emit('', result)
+        for item in self._render(prefix, content, block, list_markers):
+            self._emit(item, result)
+
+    def _render(self, prefix: str, content: str, block: str, list_markers: str) -> list[str]:
+        # Empty terms, definitions and continuations render as a non-breaking
+        # space: a line that is not blank in the source never ends up blank
+        last = prefix[-1]
+        if block == 'quote':
+            return [('> ' * len(prefix) + content).rstrip()]
+        if block == 'definitions':
+            if last != ';':
+                return [f':   {content or "&nbsp;"}']
+            term, definition = _split_definition(content)
+            # def_list takes a term right after a definition for more of it
+            rendered = [""] if self.previous and self.previous.startswith(":   ") else []
+            rendered.append(term or "&nbsp;")
+            if definition:
+                rendered.append(f':   {definition}')
+            return rendered
+
+        self._open(list_markers)
+        depth = len(list_markers) - 1
+        if last == ':':
+            # Continue the item's text at its content column, unnumbered
+            return [' ' * self.columns[depth] + (content or "&nbsp;")]
+
+        indent = '  ' * depth
+        if last == '*':
+            marker = '- '
+        else:
+            self.numbers[depth] += 1
+            marker = f'{self.numbers[depth]}. '
+        self.columns[depth] = len(indent) + len(marker)
+        return [f"{indent}{marker}{content}"]
+
+
+ENGINES = ("legacy", "single-pass")
+
+
+def convert_text(text: str, engine: str = "legacy") -> str:
+    """Run all conversions on a single MediaWiki source string.
+
+    ``engine`` is one of :data:`ENGINES`. Both produce the same Markdown.
+    The legacy pipeline stays the default: the single pass walks the page
+    line by line in Python, and the legacy passes, whole-page regular
+    expressions for the most part, are as fast on typical pages and faster
+    on long lists.
+    """
+
+    if engine == "single-pass":
+        return _convert_single_pass(text)
+    return convert_text_legacy(text)
+
+
+def convert_page(text: str, engine: str = "legacy") -> ConversionResult:
+    """Like :func:`convert_text`, also returning what the page refers to.
+
+    Assets, internal links, external URLs and categories are collected by
+    the same passes that render them, so they are exactly what ends up in
+    the Markdown and the page is not scanned a second time.
+    """
+
+    refs = _PageRefs()
+    if engine == "single-pass":
+        markdown = _convert_single_pass(text, refs)
+    else:
+        markdown = convert_text_legacy(text, refs)
+    return ConversionResult(
+        markdown,
+        list(refs.assets),
+        list(refs.links),
+        list(refs.external_urls),
+        list(refs.categories),
+    )
 
 
-def convert_text(text: str) -> str:
-    """Run all conversions on a single MediaWiki source string."""
+def convert_text_legacy(text: str, refs: _PageRefs | None = None) -> str:
+    """Run the conversion passes one after another over the whole page."""
 
     # Order matters: tables and galleries first (they do not use [[...]]), then formatting/links.
     text = convert_tables(text)
-    text = convert_galleries(text)
-    text = remove_category_links(text)
+    text = convert_galleries(text, refs)
+    text = remove_category_links(text, refs)
     text = convert_lists(text)  # Before headings to avoid confusion with ##
     text = convert_headings(text)
+    return _convert_inline(text, refs)
+
+
+def _convert_inline(text: str, refs: _PageRefs | None = None) -> str:
     text = convert_emphasis(text)
-    text = convert_external_links(text)
-    text = convert_internal_links(text)
+    text = convert_external_links(text, refs)
+    text = convert_internal_links(text, refs)
     return text
 
 
-def convert_file(src: Path) -> str:
+def _brackets_open(line: str, was_open: bool) -> bool:
+    """Whether a [ is left without a ] after it once ``line`` is added.
+
+    Category and link patterns end at the first ] after their [, so text
+    where every [ has a ] after it is never matched across its end.
+    """
+
+    close = line.rfind("]")
+    start = line.rfind("[")
+    if start > close:
+        return True
+    return was_open if close < 0 else False
+
+
+class _InlineWriter:
+    """Inline rewriting of the lines a walk over a page emits.
+
+    Emphasis, external and internal links are rewritten on the lines as
+    they are written, a chunk of up to :attr:`CHUNK_LINES` lines at a time
+    so that the regular expressions run over a few long strings rather
+    than over every line. A chunk only ends after a line whose last [ has
+    its ] on the line: no link reaches past such a line, so the chunks
+    come out as the legacy passes over the whole page would.
+    """
+
+    CHUNK_LINES = 256
+
+    def __init__(self, refs: _PageRefs | None = None) -> None:
+        self.out: list[str] = []
+        self.chunk: list[str] = []
+        self.open = False  # Whether a [ in the chunk awaits its ]
+        self.last = None  # The line written last
+        if refs is None:
+            self.external_repl = _external_link_repl
+            self.internal_repl = _internal_link_repl
+        else:
+            self.external_repl = lambda match: _external_link_repl(match, refs)
+            self.internal_repl = lambda match: _internal_link_repl(match, refs)
+
+    def _flush(self) -> None:
+        text = convert_emphasis("\n".join(self.chunk))
+        if "[http" in text:
+            text = EXT_LINK_PATTERN.sub(self.external_repl, text)
+        # Rewritten external links may put a [ next to another one
+        if "[[" in text:
+            text = INT_LINK_PATTERN.sub(self.internal_repl, text)
+        self.out.append(text)
+        self.chunk.clear()
+
+    def write(self, line: str) -> None:
+        if len(self.chunk) >= self.CHUNK_LINES and not self.open:
+            self._flush()
+        self.chunk.append(line)
+        self.last = line
+        if "[" in line or "]" in line:
+            self.open = _brackets_open(line, self.open)
+
+    def take(self) -> list[str]:
+        """Take the rewritten chunks that more of the page follows, with their line breaks.
+
+        The last one is kept until the page ends: the line after it may be
+        a blank line that is taken back.
+        """
+
+        done = [text + "\n" for text in self.out[:-1]]
+        del self.out[:-1]
+        return done
+
+    def drop_last(self) -> None:
+        """Take back the blank line written last."""
+
+        self.chunk.pop()
+
+    def close(self) -> str:
+        if self.chunk:
+            self._flush()
+        return "\n".join(self.out)
+
+
+class _HeadingReader:
+    """Turn lines into headings on their way to an :class:`_InlineWriter`.
+
+    Headings are matched with HEADING_PATTERN as convert_headings matches
+    them on the whole page. The opening =, the title and the closing = may
+    be on lines of their own, so a line starting with = is read with the
+    lines up to its second non-blank successor first. The blank lines
+    after a heading are swallowed. Only lines starting with = and lines
+    read while :attr:`busy` need to be fed, the others go to the writer.
+    """
+
+    def __init__(self, writer: _InlineWriter) -> None:
+        self.writer = writer
+        self.window: list[str] = []
+        self.titles = 0  # Non-blank lines in the window after its first
+        self.after_heading = False
+        self.busy = False
+
+    def feed(self, line: str) -> None:
+        if self.window:
+            self.window.append(line)
+            if line.strip():
+                self.titles += 1
+                if self.titles == 2:
+                    self._match()
+            return
+        if self.after_heading:
+            # A heading swallows the blank lines that follow it
+            if not line.strip():
+                return
+            self.after_heading = self.busy = False
+        if line[:1] == "=":
+            self.window.append(line)
+            self.busy = True
+        else:
+            self.writer.write(line)
+
+    def _match(self) -> None:
+        window = self.window
+        self.window = []
+        self.titles = 0
+        joined = "\n".join(window)
+        match = HEADING_PATTERN.match(joined)
+        if match is None:
+            used = 1
+            self.writer.write(window[0])
+        else:
+            used = 1 + joined.count("\n", 0, match.end())
+            self.writer.write(_heading_repl(match))
+        self.after_heading = self.busy = match is not None
+        for line in window[used:]:
+            self.feed(line)
+
+    def close(self) -> None:
+        while self.window:
+            self._match()
+
+
+class _SourceLines:
+    """Lines of a page source read with their line breaks, as from a file.
+
+    Iterating gives the lines ``text.splitlines()`` gives for the whole
+    source. Once they are all read, :attr:`ends_with_newline` tells whether
+    the source ends with a line break.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        self.lines = lines
+        self.ends_with_newline = False
+
+    def __iter__(self) -> Iterator[str]:
+        line = ""
+        for line in self.lines:
+            yield from line.splitlines()
+        self.ends_with_newline = line.endswith("\n")
+
+
+def _convert_single_pass(text: str, refs: _PageRefs | None = None) -> str:
+    """Convert a page in one walk over its lines, see _walk_page."""
+
+    return "".join(_walk_page(text.splitlines(), lambda: text.endswith("\n"), refs))
+
+
+def _walk_page(
+    lines: Iterable[str], ends_with_newline: Callable[[], bool], refs: _PageRefs | None = None
+) -> Iterator[str]:
+    """Convert the lines of a page in one walk, yielding its Markdown in pieces.
+
+    Each source line is read once and handed from the table parser to the
+    gallery parser, the category links, the list parser and the headings;
+    what comes out is finished by :class:`_InlineWriter` as it is written.
+    Plain text lines take a fast path past the block parsers. Markup the
+    legacy passes match across lines is read together: the lines up to
+    the ] closing a [ for categories and links, and a line starting with =
+    with the lines a heading can span. A piece is yielded once nothing
+    after it can change it, and ``ends_with_newline()``, whether the source
+    ends with a line break, is only asked at the end. Joined, the pieces
+    equal the legacy pipeline, and so does what is recorded in ``refs``.
+    """
+
+    # Links are collected apart and added after the assets of galleries,
+    # in the order the legacy passes find them
+    link_refs = None if refs is None else _PageRefs()
+    galleries = _GalleryParser(refs)
+    # Whether the table stage's joined text ends with a newline
+    table_text = {"ends_with_newline": False}
+
+    def gallery_stage() -> Iterator[str]:
+        table_lines: list[str] = []
+        gallery_lines: list[str] = []
+        count = 0
+        pending = None  # The last table stage line is held back to settle it
+        lines_iter = iter(lines)
+        for line in lines_iter:
+            if "{|" in line and line.strip().startswith("{|"):
+                table_lines.clear()
+                _read_table(lines_iter, table_lines)
+                stage_lines: Iterable[str] = table_lines
+            else:
+                stage_lines = (line,)
+            for stage_line in stage_lines:
+                if pending is not None:
+                    if galleries.in_gallery or "<gallery" in pending:
+                        galleries.feed(pending, gallery_lines)
+                        yield from gallery_lines
+                        gallery_lines.clear()
+                    else:
+                        # Fast path: plain text passes the gallery parser as is
+                        yield pending
+                pending = stage_line
+                count += 1
+
+        # Each legacy pass joins its lines and the next one calls
+        # splitlines(), which drops a trailing blank line unless the joined
+        # text ends with a newline, and turns a lone newline into one blank
+        # line.
+        ends = ends_with_newline()
+        if pending is None:
+            if ends:
+                galleries.feed("", gallery_lines)
+        elif pending or ends:
+            galleries.feed(pending, gallery_lines)
+        table_text["ends_with_newline"] = ends or (count >= 2 and pending == "")
+        galleries.close(gallery_lines)
+        yield from gallery_lines
+
+    writer = _InlineWriter(link_refs)
+    write = writer.write
+    headings = _HeadingReader(writer)
+    lists = _ListParser()
+    listed: list[str] = []
+
+    def read(line: str) -> None:
+        if lists.in_list or line[:1] in LIST_MARKERS:
+            lists.feed(line, listed)
+            for item in listed:
+                if headings.busy or item[:1] == "=":
+                    headings.feed(item)
+                else:
+                    write(item)
+            listed.clear()
+        else:
+            # Fast path: a plain line outside a list passes through as is
+            lists.previous = line
+            if headings.busy or line[:1] == "=":
+                headings.feed(line)
+            else:
+                write(line)
+
+    held: list[str] = []  # Lines up to the ] closing a [ on the first
+    for line in gallery_stage():
+        if len(writer.out) > 1:
+            yield from writer.take()
+        if held:
+            held.append(line)
+            if _brackets_open(line, True):
+                continue
+            line = "\n".join(held)
+            held.clear()
+        elif "[" not in line:
+            read(line)
+            continue
+        elif line.rfind("[") > line.rfind("]"):
+            held.append(line)
+            continue
+        # Every category link has a colon
+        if ":" in line and "[[" in line:
+            line = remove_category_links(line, refs)
+        if "\n" in line:
+            for part in line.split("\n"):
+                read(part)
+        else:
+            read(line)
+    if held:
+        for part in remove_category_links("\n".join(held), refs).split("\n"):
+            read(part)
+    headings.close()
+
+    # The gallery stage's text is joined and split again as well
+    if writer.last == "" and not table_text["ends_with_newline"]:
+        writer.drop_last()
+    markdown = writer.close()
+    if refs is not None:
+        refs.assets.update(link_refs.assets)
+        refs.links.update(link_refs.links)
+        refs.external_urls.update(link_refs.external_urls)
+    yield markdown
+
+
+def convert_texts(texts: list[str], engine: str = "legacy", workers: int = 1) -> list[str]:
+    """Convert many pages, in a pool of ``workers`` processes if more than one.
+
+    Results are returned in the order of ``texts``.
+    """
+
+    return _map_pages(convert_text, texts, engine, workers)
+
+
+def convert_pages(
+    texts: list[str], engine: str = "legacy", workers: int = 1
+) -> list[ConversionResult]:
+    """Like :func:`convert_texts`, returning a :class:`ConversionResult` per page."""
+
+    return _map_pages(convert_page, texts, engine, workers)
+
+
+def iter_convert_pages(
+    texts: Iterable[str], engine: str = "legacy", workers: int = 1
+) -> Iterator[ConversionResult]:
+    """Like :func:`convert_pages`, yielding each result in order as it is ready.
+
+    ``texts`` is read as the results are taken: with ``workers`` processes
+    a few pages per worker are converted ahead of the one yielded, so the
+    pages held at a time do not grow with their number.
+    """
+
+    if workers <= 1:
+        for text in texts:
+            yield convert_page(text, engine)
+        return
+    ahead = workers * 4
+    pending: deque[Future[ConversionResult]] = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for text in texts:
+            pending.append(pool.submit(convert_page, text, engine))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _map_pages(
+    func: Callable[[str, str], _R], texts: list[str], engine: str, workers: int
+) -> list[_R]:
+    if workers <= 1 or len(texts) < 2:
+        return [func(text, engine) for text in texts]
+    workers = min(workers, len(texts))
+    # A few chunks per worker keeps the pipes busy without starving workers
+    chunksize = max(1, len(texts) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, texts, [engine] * len(texts), chunksize=chunksize))
+
+
+def convert_file(src: Path, engine: str = "legacy") -> str:
     raw = src.read_text(encoding="utf-8", errors="ignore")
-    return convert_text(raw)
+    return convert_text(raw, engine)
+
+
+def convert_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Convert a page given as lines, yielding Markdown lines.
+
+    Lines keep their line endings on both sides (as when iterating over a
+    file), so ``"".join(convert_lines(f))`` is the converted page, the same
+    as convert_text gives. The lines go through the single-pass walk (see
+    _walk_page), which hands on the Markdown of the lines it is done with,
+    so memory is bounded by the largest table, gallery or chunk of lines
+    being rewritten rather than by the page. Text after a [ is held until
+    the ] closing it, as links may span lines.
+    """
+
+    source = _SourceLines(lines)
+    for piece in _walk_page(source, lambda: source.ends_with_newline):
+        yield from piece.splitlines(keepends=True)
+
+
+def convert_file_streaming(
+    src: Path, dst: Path | None, finalize: Callable[[str], str] | None = None
+) -> tuple[ConversionResult, str]:
+    """Convert ``src`` into ``dst`` piece by piece, see convert_lines.
+
+    ``finalize`` is applied to every piece of Markdown before it is written,
+    as finalize_markdown is to whole pages; pieces end at line breaks
+    outside links. The output is written to a temporary file next to
+    ``dst`` and renamed into place, so a failed conversion never leaves a
+    partial page; without ``dst`` nothing is written. Returns what the page
+    refers to, as a ConversionResult without its Markdown, and the hash of
+    the Markdown.
+    """
+
+    refs = _PageRefs()
+    digest = hashlib.sha256()
+    tmp = None if dst is None else dst.with_name(dst.name + ".tmp")
+    with src.open(encoding="utf-8", errors="ignore") as fin, (
+        open(os.devnull, "w", encoding="utf-8") if tmp is None else tmp.open("w", encoding="utf-8")
+    ) as fout:
+        source = _SourceLines(fin)
+        for piece in _walk_page(source, lambda: source.ends_with_newline, refs):
+            if finalize is not None:
+                piece = finalize(piece)
+            digest.update(piece.encode("utf-8"))
+            fout.write(piece)
+    if tmp is not None:
+        tmp.replace(dst)
+    result = ConversionResult(
+        "",
+        list(refs.assets),
+        list(refs.links),
+        list(refs.external_urls),
+        list(refs.categories),
+    )
+    return result, digest.hexdigest()
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _hash_file(path: Path) -> str:
+    """_hash_text of a text file, read line by line."""
+
+    digest = hashlib.sha256()
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            digest.update(line.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _scan_source(src: Path) -> tuple[str, bool]:
+    """Hash of a page source read line by line, and whether it has templates.
+
+    Template calls and the <includeonly> family of tags are handled by
+    TemplateExpander, which needs the whole source.
+    """
+
+    digest = hashlib.sha256()
+    templates = False
+    with src.open(encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            digest.update(line.encode("utf-8"))
+            templates = templates or "{{" in line or "include" in line
+    return digest.hexdigest(), templates
+
+
+def converter_version(engine: str, templates: bool = True) -> str:
+    """Hash of the converter scripts, engine and template expansion, stored in the manifest.
+
+    Any change to the conversion code (CONVERTER_SOURCES) invalidates all
+    manifest entries, so pages are reconverted after the converter itself is
+    modified; the other scripts, such as the benchmark, do not count.
+    """
+
+    digest = hashlib.sha256(engine.encode("utf-8"))
+    digest.update(b"templates" if templates else b"")
+    scripts_dir = Path(__file__).resolve().parent
+    for name in CONVERTER_SOURCES:
+        digest.update(name.encode("utf-8"))
+        digest.update((scripts_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+def _load_manifest(path: Path) -> dict:
+    """Load the incremental conversion manifest, empty if missing or broken.
+
+    Layout: {"converter": <hash>, "pages": {<source name>: {"source": <hash>,
+    "output": <path relative to ROOT>, "output_hash": <hash>,
+    "templates": {<template>: <revision>}}}}
+    """
+
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"converter": "", "pages": {}}
+    if not isinstance(data, dict) or not isinstance(data.get("pages"), dict):
+        return {"converter": "", "pages": {}}
+    return data
+
+
+def _load_sync_state(path: Path) -> dict:
+    """Load the --sync state, empty if missing or broken.
+
+    Layout: {"timestamp": <UTC time of the last sync>, "pages": {<title>: <revid>},
+    "templates": {<title>: {<template>: <revision>}}, "refs": {<title>: <page refs>}},
+    the page refs are those of the manifest, see _page_refs_entry.
+    """
+
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"timestamp": None, "pages": {}}
+    if not isinstance(data, dict) or not isinstance(data.get("pages"), dict):
+        return {"timestamp": None, "pages": {}}
+    return data
+
+
+def _is_up_to_date(
+    entry: Mapping | None, source_hash: str, dst: Path, expander: TemplateExpander | None
+) -> bool:
+    """Whether a manifest entry matches the source, templates and output of a page."""
+
+    dst_rel = dst.relative_to(ROOT) if dst.is_relative_to(ROOT) else dst
+    return bool(
+        entry
+        and entry.get("source") == source_hash
+        and entry.get("output") == dst_rel.as_posix()
+        and dst.is_file()
+        and _hash_file(dst) == entry.get("output_hash")
+        and (
+            expander is None
+            or all(
+                expander.revision(name) == revision
+                for name, revision in entry.get("templates", {}).items()
+            )
+        )
+    )
+
+
+def _page_refs_entry(dst: Path, result: ConversionResult) -> dict:
+    """The output and the references of a converted page, as the link graph reads them."""
+
+    dst_rel = dst.relative_to(ROOT) if dst.is_relative_to(ROOT) else dst
+    return {
+        "output": dst_rel.as_posix(),
+        "assets": result.assets,
+        "links": result.links,
+        "external_urls": result.external_urls,
+        "categories": result.categories,
+    }
+
+
+def _manifest_entry(
+    source_hash: str, dst: Path, output_hash: str, result: ConversionResult, templates: dict[str, str]
+) -> dict:
+    """The manifest entry of a converted page, see _load_manifest."""
+
+    return {
+        "source": source_hash,
+        **_page_refs_entry(dst, result),
+        "output_hash": output_hash,
+        "templates": templates,
+    }
+
+
+@dataclass
+class _LocalPage:
+    """A page of local mode, see _convert_local_pages."""
+
+    src: Path
+    dst: Path
+    source_hash: str
+    entry: dict | None = None  # The manifest entry of a page that is up to date
+    templates: dict[str, str] = field(default_factory=dict)  # Revisions of those used
+    result: ConversionResult | None = None
+    stream: bool = False  # Whether it is left for convert_file_streaming
+
+
+def _convert_local_pages(
+    src_paths: Iterable[Path],
+    output: Path | None,
+    old_pages: Mapping[str, dict],
+    expander: TemplateExpander | None,
+    engine: str,
+    workers: int,
+) -> Iterator[_LocalPage]:
+    """Read and convert local sources in order, yielding each page when it is ready.
+
+    Pages up to date with their ``old_pages`` entry come with that entry.
+    Sources larger than STREAM_THRESHOLD without templates to expand are
+    only hashed and left for convert_file_streaming, the others come with
+    their conversion. Sources are read and converted (see
+    iter_convert_pages) only a few pages ahead of the one yielded.
+    """
+
+    plans: deque[_LocalPage] = deque()
+
+    def texts() -> Iterator[str]:
+        for src in src_paths:
+            if not src.is_file():
+                continue
+            dst = output or DOCS_DIR / f"{src.stem}.md"
+            stream = False
+            if src.stat().st_size > STREAM_THRESHOLD:
+                source_hash, templates = _scan_source(src)
+                stream = expander is None or not templates
+            if not stream:
+                raw = src.read_text(encoding="utf-8", errors="ignore")
+                source_hash = _hash_text(raw)
+            page = _LocalPage(src, dst, source_hash, old_pages.get(src.name), stream=stream)
+            if _is_up_to_date(page.entry, source_hash, dst, expander):
+                plans.append(page)
+                continue
+            page.entry = None
+            plans.append(page)
+            if stream:
+                continue
+            if expander is not None:
+                raw = expander.expand(raw, page.templates)
+            yield raw
+
+    for result in iter_convert_pages(texts(), engine, workers):
+        # Pages read ahead of the converted one come first
+        while plans[0].entry is not None or plans[0].stream:
+            yield plans.popleft()
+        page = plans.popleft()
+        page.result = result
+        yield page
+    while plans:
+        yield plans.popleft()
+
+
+def _save_json(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(
+        json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True) + "\n",
+        encoding="utf-8",
+    )
+    tmp.replace(path)
+
+
+def build_link_graph(
+    pages: Mapping[str, Mapping[str, list[str]]],
+    docs_dir: Path,
+    asset_aliases: Mapping[str, str] | None = None,
+) -> dict:
+    """Build the site link graph from what every page refers to.
+
+    ``pages`` maps the path of each Markdown page relative to ``docs_dir``
+    to its references as stored in the manifest ("links" are page titles,
+    "assets" file names, see :class:`ConversionResult`). Duplicate assets
+    are linked under their canonical name from ``asset_aliases``, as the
+    written Markdown links them. The graph holds,
+    with all paths relative to ``docs_dir``:
+
+    - ``pages``: for every page the targets of its page links, images and
+      other files (as the Markdown links them) and its categories;
+    - ``backlinks``: for every linked page, the pages linking to it;
+    - ``orphans``: pages no other page links to;
+    - ``dangling``: link targets that are neither a page of the graph nor
+      a file in ``docs_dir``, with the pages linking to them.
+    """
+
+    graph_pages: dict[str, dict] = {}
+    backlinks: dict[str, dict[str, None]] = {}
+    for page, refs in sorted(pages.items()):
+        base = posixpath.dirname(page)
+        links = [
+            posixpath.normpath(posixpath.join(base, page_href(title)))
+            for title in refs.get("links", [])
+        ]
+        images: list[str] = []
+        files: list[str] = []
+        for filename in refs.get("assets", []):
+            if asset_aliases:
+                filename = canonical_asset(filename, asset_aliases)
+            href = posixpath.normpath(posixpath.join(base, asset_href(filename)))
+            if file_extension(filename) in IMAGE_EXTENSIONS:
+                images.append(href)
+            else:
+                files.append(href)
+        graph_pages[page] = {
+            "links": list(dict.fromkeys(links)),
+            "images": list(dict.fromkeys(images)),
+            "files": list(dict.fromkeys(files)),
+            "categories": list(refs.get("categories", [])),
+        }
+        for target in links:
+            if target != page:
+                backlinks.setdefault(target, {})[page] = None
+
+    dangling = {
+        target: list(sources)
+        for target, sources in sorted(backlinks.items())
+        if target not in graph_pages and not (docs_dir / target).exists()
+    }
+    return {
+        "pages": graph_pages,
+        "backlinks": {target: list(sources) for target, sources in sorted(backlinks.items())},
+        "orphans": [page for page in graph_pages if page not in backlinks],
+        "dangling": dangling,
+    }
+
+
+def _save_link_graph(manifest_pages: Mapping[str, dict], asset_aliases: Mapping[str, str]) -> dict:
+    """Build the link graph of the pages in the manifest and write it to LINK_GRAPH_FILE.
+
+    Any mapping of _page_refs_entry entries will do, remote mode passes the
+    refs of its sync state.
+    """
+
+    # Every page is in the manifest, converted or skipped, so the link graph
+    # of the whole site comes from it without a re-scan
+    outputs = {ROOT / entry["output"]: entry for entry in manifest_pages.values()}
+    graph = build_link_graph(
+        {
+            dst.relative_to(DOCS_DIR).as_posix(): entry
+            for dst, entry in outputs.items()
+            if dst.is_relative_to(DOCS_DIR)
+        },
+        DOCS_DIR,
+        asset_aliases,
+    )
+    _save_json(LINK_GRAPH_FILE, graph)
+    return graph
+
+
+def _print_link_graph(graph: dict) -> None:
+    print(
+        f"Link graph: {len(graph['pages'])} page(s), "
+        f"{len(graph['orphans'])} orphan(s), "
+        f"{len(graph['dangling'])} dangling target(s)"
+    )
 
 
 def _load_remote_titles(pages_file: Path) -> list[str]:
@@ -562,14 +1572,429 @@ def _load_remote_titles(pages_file: Path) -> list[str]:
     return titles
 
 
+class _HostLimiter:
+    """Cap the number of simultaneous requests sent to each host."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+
+    def reset(self, limit: int) -> None:
+        with self._lock:
+            self.limit = max(1, limit)
+            self._slots.clear()
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._slots.get(host)
+            if semaphore is None:
+                semaphore = self._slots[host] = threading.BoundedSemaphore(self.limit)
+        with semaphore:
+            yield
+
+
+_HOST_LIMITER = _HostLimiter(MAX_REQUESTS_PER_HOST)
+
+
+class _HTTPClient:
+    """Keep-alive HTTP(S) client shared by all requests to the wiki.
+
+    Idle connections are kept per host (up to ``pool_size``) and reused, so
+    only the first request to a host pays for the TCP and TLS handshakes.
+    Network errors and 429/5xx answers are retried with exponential backoff.
+    Failures are raised as urllib.error.HTTPError / URLError, like urlopen.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+    MAX_REDIRECTS = 5
+
+    def __init__(
+        self, pool_size: int, retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF
+    ) -> None:
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._ssl_context = ssl.create_default_context()
+        self._headers = {
+            "User-Agent": "Python-urllib/%d.%d" % sys.version_info[:2],
+            "Connection": "keep-alive",
+        }
+
+    def reset(self, pool_size: int, retries: int | None = None) -> None:
+        self.close()
+        self.pool_size = max(1, pool_size)
+        if retries is not None:
+            self.retries = max(0, retries)
+
+    def close(self) -> None:
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+    def get(self, url: str, timeout: float = 30) -> bytes:
+        return self.request(url, timeout)[2]
+
+    def request(
+        self, url: str, timeout: float = 30, headers: dict[str, str] | None = None
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        """GET ``url`` with extra ``headers``, return status, headers and body.
+
+        Unlike errors, 304 Not Modified is returned as a status.
+        """
+
+        return self._retry(self._request, url, timeout, headers)
+
+    def download(
+        self,
+        url: str,
+        dest: Path,
+        timeout: float = 30,
+        size: int | None = None,
+        sha1: str | None = None,
+    ) -> None:
+        """Stream ``url`` into ``dest`` in DOWNLOAD_CHUNK_SIZE chunks.
+
+        Data goes to ``dest.part`` first and is renamed into place only after
+        its length (Content-Length, ``size``) and ``sha1`` are verified, so an
+        interrupted download never leaves a truncated ``dest``. A ``.part``
+        left by an earlier attempt is resumed with an HTTP Range request.
+        """
+
+        self._retry(self._download, url, dest, timeout, size, sha1)
+
+    def _retry(self, func: Callable[..., _R], *args: object) -> _R:
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except urllib.error.HTTPError as e:
+                if e.code not in self.RETRY_STATUSES or attempt == self.retries:
+                    raise
+            except urllib.error.URLError:
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+        raise AssertionError("unreachable")
+
+    def _request(
+        self, url: str, timeout: float, headers: dict[str, str] | None
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        key, conn, resp = self._open(url, timeout, headers)
+        try:
+            body = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e) from e
+        self._finish(key, conn, resp)
+        return resp.status, resp.headers, body
+
+    def _download(
+        self,
+        url: str,
+        dest: Path,
+        timeout: float,
+        size: int | None,
+        sha1: str | None,
+    ) -> None:
+        part = dest.with_name(dest.name + ".part")
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        try:
+            key, conn, resp = self._open(url, timeout, headers)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or not offset:
+                raise
+            # The partial file is not a prefix of the current one, start over
+            part.unlink()
+            return self._download(url, dest, timeout, size, sha1)
+        if resp.status != 206:
+            offset = 0  # Range was ignored, the whole file follows
+
+        length = resp.headers.get("Content-Length")
+        expected = offset + int(length) if length and length.isdigit() else size
+        digest = hashlib.sha1() if sha1 else None
+        if digest is not None and offset:
+            with part.open("rb") as f:
+                for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+
+        try:
+            with part.open("ab" if offset else "wb") as f:
+                for chunk in iter(lambda: resp.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            # Keep the partial file, the next attempt resumes from it
+            raise urllib.error.URLError(e) from e
+        self._finish(key, conn, resp)
+
+        written = part.stat().st_size
+        if expected is not None and written < expected:
+            raise urllib.error.URLError(
+                f"incomplete download of {url}: {written} of {expected} bytes"
+            )
+        if (expected is not None and written != expected) or (
+            size is not None and written != size
+        ):
+            part.unlink()
+            raise urllib.error.URLError(
+                f"size mismatch for {url}: got {written} bytes, "
+                f"expected {size if size is not None else expected}"
+            )
+        if digest is not None and digest.hexdigest() != sha1:
+            part.unlink()
+            raise urllib.error.URLError(f"checksum mismatch for {url}")
+        part.replace(dest)
+
+    def _open(
+        self, url: str, timeout: float, headers: dict[str, str] | None = None
+    ) -> tuple[tuple[str, str], http.client.HTTPConnection, http.client.HTTPResponse]:
+        """Send a GET, following redirects, and return the final response.
+
+        The body is left unread for the caller, who must hand the connection
+        back with _finish. Error statuses raise urllib.error.HTTPError.
+        """
+
+        for _ in range(self.MAX_REDIRECTS + 1):
+            key, conn, resp = self._send(url, timeout, headers)
+            location = resp.headers.get("Location")
+            if resp.status in self.REDIRECT_STATUSES and location:
+                self._discard(key, conn, resp)
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if resp.status >= 400:
+                self._discard(key, conn, resp)
+                raise urllib.error.HTTPError(
+                    url, resp.status, resp.reason, resp.headers, None
+                )
+            return key, conn, resp
+        raise urllib.error.URLError(f"too many redirects for {url}")
+
+    def _send(
+        self, url: str, timeout: float, headers: dict[str, str] | None
+    ) -> tuple[tuple[str, str], http.client.HTTPConnection, http.client.HTTPResponse]:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise urllib.error.URLError(f"unsupported URL scheme: {url}")
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        conn, reused = self._acquire(key, timeout)
+        try:
+            conn.request("GET", path, headers={**self._headers, **(headers or {})})
+            resp = conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            if reused:
+                # The server may have dropped the idle connection, try a fresh one
+                return self._send(url, timeout, headers)
+            raise urllib.error.URLError(e) from e
+        return key, conn, resp
+
+    def _discard(
+        self,
+        key: tuple[str, str],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+    ) -> None:
+        try:
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return
+        self._finish(key, conn, resp)
+
+    def _finish(
+        self,
+        key: tuple[str, str],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+    ) -> None:
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+
+    def _acquire(
+        self, key: tuple[str, str], timeout: float
+    ) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(
+                netloc, timeout=timeout, context=self._ssl_context
+            ), False
+        return http.client.HTTPConnection(netloc, timeout=timeout), False
+
+    def _release(self, key: tuple[str, str], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+_HTTP_CLIENT = _HTTPClient(MAX_REQUESTS_PER_HOST)
+
+
+class _ResponseCache:
+    """On-disk cache of wiki responses (raw pages, API queries), keyed by URL.
+
+    Each body is stored with the ETag / Last-Modified validators it came
+    with, so that _fetch_bytes can revalidate it with a conditional GET. In
+    offline mode the cache answers every request and the network is never
+    used. A cache without a directory is disabled.
+    """
+
+    def __init__(self, directory: Path | None = None, offline: bool = False) -> None:
+        self.directory = directory
+        self.offline = offline
+
+    def reset(self, directory: Path | None, offline: bool = False) -> None:
+        self.directory = directory
+        self.offline = offline
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = self.directory / key[:2] / key
+        return base.with_suffix(".json"), base.with_suffix(".body")
+
+    def load(self, url: str) -> tuple[bytes, dict] | None:
+        """Return the cached body of ``url`` and its metadata, if valid."""
+
+        if self.directory is None:
+            return None
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        # The body is written before its metadata, a mismatch means a write
+        # was interrupted
+        if meta.get("url") != url or meta.get("sha256") != hashlib.sha256(body).hexdigest():
+            return None
+        return body, meta
+
+    def store(self, url: str, body: bytes, headers: Mapping[str, str]) -> None:
+        if self.directory is None:
+            return
+        meta_path, body_path = self._paths(url)
+        meta = {
+            "url": url,
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        # Requests run in threads, temporary names must not collide
+        suffix = f".{threading.get_ident()}.tmp"
+        tmp = body_path.with_name(body_path.name + suffix)
+        tmp.write_bytes(body)
+        tmp.replace(body_path)
+        tmp = meta_path.with_name(meta_path.name + suffix)
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(meta_path)
+
+
+_RESPONSE_CACHE = _ResponseCache()
+
+
+def _fetch_bytes(url: str, timeout: float = 30) -> bytes:
+    """Read the whole response body of ``url`` within the per-host limit.
+
+    Requests go through the shared keep-alive client; its urllib errors
+    propagate unchanged so callers keep their own reporting. With the
+    response cache enabled a cached body is revalidated with its ETag /
+    Last-Modified and reused on 304 Not Modified; in offline mode it is
+    returned as is, and a URL that is not cached raises URLError.
+    """
+
+    cached = _RESPONSE_CACHE.load(url)
+    if _RESPONSE_CACHE.offline:
+        if cached is None:
+            raise urllib.error.URLError(f"not in the offline cache: {url}")
+        return cached[0]
+
+    headers: dict[str, str] = {}
+    if cached is not None:
+        _, meta = cached
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    with _HOST_LIMITER.slot(url):
+        status, response_headers, body = _HTTP_CLIENT.request(url, timeout, headers)
+    if status == 304 and cached is not None:
+        return cached[0]
+    _RESPONSE_CACHE.store(url, body, response_headers)
+    return body
+
+
+def _download_file(
+    url: str,
+    dest: Path,
+    size: int | None = None,
+    sha1: str | None = None,
+    timeout: float = 30,
+) -> None:
+    """Stream ``url`` into ``dest`` within the per-host limit, see _HTTPClient.download."""
+
+    if _RESPONSE_CACHE.offline:
+        # Files are not kept in the response cache, docs/assets is their store
+        raise urllib.error.URLError(f"offline, not downloading {url}")
+    with _HOST_LIMITER.slot(url):
+        _HTTP_CLIENT.download(url, dest, timeout, size, sha1)
+
+
+def _run_parallel(
+    func: Callable[[_T], _R], items: Iterable[_T], jobs: int
+) -> list[tuple[_R | None, Exception | None]]:
+    """Call ``func`` on every item using up to ``jobs`` threads.
+
+    Returns one ``(result, error)`` pair per item, in the order of ``items``,
+    so callers can report and write output deterministically.
+    """
+
+    def call(item: _T) -> tuple[_R | None, Exception | None]:
+        try:
+            return func(item), None
+        except Exception as e:  # noqa: BLE001 - reported by the caller
+            return None, e
+
+    if jobs <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(call, items))
+
+
 def fetch_page_raw(title: str) -> str:
     """Fetch raw MediaWiki source for a single page title from the live wiki."""
 
     encoded = urllib.parse.quote(title)
     url = f"{MEDIAWIKI_BASE_URL}?title={encoded}&action=raw"
     try:
-        with urllib.request.urlopen(url, timeout=30) as resp:
-            data = resp.read()
+        data = _fetch_bytes(url)
     except urllib.error.HTTPError as e:
         raise RuntimeError(
             f"HTTP error {e.code} while fetching {title!r} from {url}"
@@ -584,8 +2009,6 @@ def fetch_page_raw(title: str) -> str:
 def fetch_all_pages_from_api() -> list[str]:
     """Fetch list of all pages from MediaWiki API (excluding redirects)."""
     
-    import json
-    
     pages = []
     apcontinue = None
     
@@ -606,8 +2029,7 @@ def fetch_all_pages_from_api() -> list[str]:
         api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
         
         try:
-            with urllib.request.urlopen(api_url, timeout=30) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
             
             # Extract page titles
             if "query" in data and "allpages" in data["query"]:
@@ -632,9 +2054,7 @@ def fetch_all_pages_from_api() -> list[str]:
 def fetch_redirects_from_api() -> dict[str, str]:
     """Fetch all redirects from MediaWiki API. Returns dict of {redirect_title: target_title}."""
     
-    import json
-    
-    redirects = {}
+    titles: list[str] = []
     apcontinue = None
     
     while True:
@@ -654,18 +2074,14 @@ def fetch_redirects_from_api() -> dict[str, str]:
         api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
         
         try:
-            with urllib.request.urlopen(api_url, timeout=30) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
             
             # Extract redirect titles
             if "query" in data and "allpages" in data["query"]:
                 for page in data["query"]["allpages"]:
                     title = page.get("title", "")
                     if title:
-                        # Get redirect target
-                        target = get_redirect_target(title)
-                        if target:
-                            redirects[title] = target
+                        titles.append(title)
             
             # Check if there are more pages
             if "continue" in data and "apcontinue" in data["continue"]:
@@ -677,49 +2093,219 @@ def fetch_redirects_from_api() -> dict[str, str]:
             print(f"Error fetching redirects from API: {e}")
             break
     
-    return redirects
+    return get_redirect_targets(titles)
+
+
+def get_redirect_target(title: str) -> str | None:
+    """Get the target page for a redirect."""
+    
+    return get_redirect_targets([title]).get(title)
+
+
+def get_redirect_targets(titles: Iterable[str]) -> dict[str, str]:
+    """Resolve redirect targets for many titles, API_TITLES_LIMIT per request.
+    
+    Returns {redirect_title: target_title} for the titles that are redirects.
+    A failed batch is reported and skipped, the other batches still resolve.
+    """
+    
+    wanted = list(dict.fromkeys(titles))
+    targets: dict[str, str] = {}
+    
+    for start in range(0, len(wanted), API_TITLES_LIMIT):
+        batch = wanted[start:start + API_TITLES_LIMIT]
+        requested = set(batch)
+        params = {
+            "action": "query",
+            "titles": "|".join(batch),
+            "redirects": "1",
+            "format": "json",
+        }
+        
+        query_string = urllib.parse.urlencode(params)
+        api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
+        
+        try:
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
+        except Exception as e:
+            print(f"Error resolving redirects from API: {e}")
+            continue
+        
+        query = data.get("query", {})
+        # The API reports titles it normalized (e.g. first letter case) separately
+        normalized = {n.get("to"): n.get("from") for n in query.get("normalized", [])}
+        # Double redirects are followed, so a batch may report intermediate hops;
+        # keep only the first hop of every requested title
+        for redirect in query.get("redirects", []):
+            source = redirect.get("from")
+            source = normalized.get(source, source)
+            target = redirect.get("to")
+            if source in requested and target and source not in targets:
+                targets[source] = target
+    
+    return {title: targets[title] for title in wanted if title in targets}
+
+
+def get_latest_revisions(titles: Iterable[str]) -> dict[str, dict | None]:
+    """Look up the current revision of many pages, API_TITLES_LIMIT per request.
+    
+    Returns {title: {"revid": int, "redirect": bool}} for existing pages and
+    {title: None} for pages the wiki reports as missing (deleted or moved
+    without a redirect). Titles of failed batches are left out.
+    """
+    
+    wanted = list(dict.fromkeys(titles))
+    revisions: dict[str, dict | None] = {}
+    
+    for start in range(0, len(wanted), API_TITLES_LIMIT):
+        batch = wanted[start:start + API_TITLES_LIMIT]
+        params = {
+            "action": "query",
+            "titles": "|".join(batch),
+            "prop": "revisions|info",
+            "rvprop": "ids",
+            "format": "json",
+        }
+        
+        query_string = urllib.parse.urlencode(params)
+        api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
+        
+        try:
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
+        except Exception as e:
+            print(f"Error fetching revisions from API: {e}")
+            continue
+        
+        query = data.get("query", {})
+        normalized = {n.get("to"): n.get("from") for n in query.get("normalized", [])}
+        for page in query.get("pages", {}).values():
+            title = page.get("title", "")
+            title = normalized.get(title, title)
+            if "missing" in page or "invalid" in page:
+                revisions[title] = None
+            elif page.get("revisions"):
+                revisions[title] = {
+                    "revid": page["revisions"][0].get("revid"),
+                    "redirect": "redirect" in page,
+                }
+    
+    return revisions
+
+
+def fetch_templates_from_api(names: Iterable[str]) -> dict[str, tuple[str, str] | None]:
+    """Fetch the source and revision of many templates, API_TITLES_LIMIT per request.
+
+    Returns {name: (revid, source)} for existing templates and {name: None}
+    for missing ones; names are without the namespace. Names of failed
+    batches are left out.
+    """
+
+    wanted = list(dict.fromkeys(names))
+    templates: dict[str, tuple[str, str] | None] = {}
+
+    for start in range(0, len(wanted), API_TITLES_LIMIT):
+        batch = {f"{TEMPLATE_NAMESPACE}:{name}": name for name in wanted[start:start + API_TITLES_LIMIT]}
+        params = {
+            "action": "query",
+            "titles": "|".join(batch),
+            "prop": "revisions",
+            "rvprop": "ids|content",
+            "rvslots": "main",
+            "format": "json",
+        }
+
+        query_string = urllib.parse.urlencode(params)
+        api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
+
+        try:
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
+        except Exception as e:
+            print(f"Error fetching templates from API: {e}")
+            continue
 
+        query = data.get("query", {})
+        normalized = {n.get("to"): n.get("from") for n in query.get("normalized", [])}
+        for page in query.get("pages", {}).values():
+            title = page.get("title", "")
+            name = batch.get(normalized.get(title, title))
+            if name is None:
+                continue
+            if "missing" in page or "invalid" in page or not page.get("revisions"):
+                templates[name] = None
+                continue
+            revision = page["revisions"][0]
+            # MediaWiki 1.32+ keeps the content in slots, older versions in the revision
+            content = revision.get("slots", {}).get("main", revision).get("*", "")
+            templates[name] = (str(revision.get("revid")), content)
 
-def get_redirect_target(title: str) -> str | None:
-    """Get the target page for a redirect."""
-    
-    import json
-    
-    params = {
-        "action": "query",
-        "titles": title,
-        "redirects": "1",
-        "format": "json",
-    }
-    
-    query_string = urllib.parse.urlencode(params)
-    api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
-    
-    try:
-        with urllib.request.urlopen(api_url, timeout=30) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        
-        # Check for redirects in response
-        if "query" in data and "redirects" in data["query"]:
-            redirects_list = data["query"]["redirects"]
-            if redirects_list and len(redirects_list) > 0:
-                return redirects_list[0].get("to")
-        
-        return None
-        
-    except Exception:
+    return templates
+
+
+class _LocalTemplates:
+    """Template sources in mediawiki/, the revision is the hash of the source."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def __call__(self, name: str) -> tuple[str, str] | None:
+        for namespace in (TEMPLATE_NAMESPACE, "Template"):
+            path = self.directory / f"{sanitize_title_to_filename(f'{namespace}:{name}')}.mediawiki"
+            if path.is_file():
+                text = path.read_text(encoding="utf-8", errors="ignore")
+                return _hash_text(text), text
         return None
 
 
+class _RemoteTemplates:
+    """Template sources on the wiki, the revision is the revision id.
+
+    ``prefetch`` looks many templates up in a few batched queries; templates
+    only called from other templates are looked up one at a time.
+    """
+
+    def __init__(self) -> None:
+        self._templates: dict[str, tuple[str, str] | None] = {}
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        wanted = [name for name in dict.fromkeys(names) if name not in self._templates]
+        if not wanted:
+            return
+        found = fetch_templates_from_api(wanted)
+        for name in wanted:
+            # Templates of failed batches count as missing for this run
+            self._templates[name] = found.get(name)
+
+    def __call__(self, name: str) -> tuple[str, str] | None:
+        self.prefetch([name])
+        return self._templates[name]
+
+
+def _report_templates(expander: TemplateExpander | None) -> None:
+    """Print how many template calls were expanded and which templates are missing."""
+
+    if expander is None or not (expander.hits or expander.misses or expander.missing):
+        return
+    print(
+        f"Templates: {expander.hits + expander.misses} expansion(s), "
+        f"{expander.hits} from cache"
+    )
+    if expander.missing:
+        print(f"Missing template(s), left as written: {', '.join(sorted(expander.missing))}")
+
+
 def extract_image_filenames(text: str) -> set[str]:
-    """Extract all image filenames from MediaWiki text."""
+    """Extract all image filenames from MediaWiki text.
+
+    This scans the source on its own; :func:`convert_page` collects the
+    same names while converting the page.
+    """
     
     images: set[str] = set()
     
     # Find [[Файл:...]] and [[File:...]] and [[:Файл:...]] links
-    for match in _INT_LINK_PATTERN.finditer(text):
+    for match in INT_LINK_PATTERN.finditer(text):
         target = match.group(1).strip()
-        if _is_file_link_target(target):
+        if is_file_link_target(target):
             # Remove leading colon if present
             clean_target = target.lstrip(':')
             rest = clean_target.split(":", 1)[1].strip() if ":" in clean_target else clean_target
@@ -727,10 +2313,6 @@ def extract_image_filenames(text: str) -> set[str]:
             images.add(filename)
     
     # Find images in <gallery> tags - handle both multiline and inline galleries
-    in_gallery = False
-    gallery_content = []
-    
-    # First, extract all gallery content
     i = 0
     while i < len(text):
         gallery_start = text.find("<gallery", i)
@@ -745,28 +2327,22 @@ def extract_image_filenames(text: str) -> set[str]:
         if gallery_end == -1:
             break
         
-        # Extract content between <gallery...> and </gallery>
-        content = text[gallery_tag_end + 1:gallery_end]
-        gallery_content.append(content)
-        
-        i = gallery_end + len("</gallery>")
-    
-    # Parse gallery content for filenames
-    for content in gallery_content:
-        for line in content.splitlines():
+        # Parse the content between <gallery...> and </gallery> for filenames
+        for line in text[gallery_tag_end + 1:gallery_end].splitlines():
             stripped = line.strip()
             if not stripped:
                 continue
             
             # Check if line starts with file marker
-            lower_line = stripped.lower()
-            if lower_line.startswith(("файл:", "file:")):
+            if stripped.lower().startswith(FILE_PREFIXES):
                 colon_pos = stripped.find(":")
                 if colon_pos != -1:
                     rest = stripped[colon_pos + 1:]
                     parts = [p.strip() for p in rest.split("|")]
                     if parts and parts[0]:
                         images.add(parts[0])
+        
+        i = gallery_end + len("</gallery>")
     
     return images
 
@@ -774,83 +2350,537 @@ def extract_image_filenames(text: str) -> set[str]:
 def get_image_url_from_api(filename: str) -> str | None:
     """Get the actual image URL from MediaWiki API."""
     
-    import json
+    info = get_image_info_from_api([filename]).get(filename)
+    return info["url"] if info else None
+
+
+def get_image_info_from_api(filenames: Iterable[str]) -> dict[str, dict]:
+    """Resolve download info for many files, API_TITLES_LIMIT per request.
     
-    # Construct API query
-    title = f"File:{filename}"
-    params = {
-        "action": "query",
-        "titles": title,
-        "prop": "imageinfo",
-        "iiprop": "url",
-        "format": "json",
-    }
+    Returns {filename: {"url": str, "size": int | None, "sha1": str | None}}
+    for the files the wiki knows about; filenames are the ones given, without
+    the File: prefix.
+    """
     
-    query_string = urllib.parse.urlencode(params)
-    api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
+    wanted = list(dict.fromkeys(filenames))
+    image_info: dict[str, dict] = {}
     
-    try:
-        with urllib.request.urlopen(api_url, timeout=30) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
+    for start in range(0, len(wanted), API_TITLES_LIMIT):
+        batch = wanted[start:start + API_TITLES_LIMIT]
+        # Construct API query
+        params = {
+            "action": "query",
+            "titles": "|".join(f"File:{filename}" for filename in batch),
+            "prop": "imageinfo",
+            "iiprop": "url|size|sha1",
+            "format": "json",
+        }
         
-        # Extract image URL from response
-        if "query" in data and "pages" in data["query"]:
-            for page in data["query"]["pages"].values():
-                if "imageinfo" in page and len(page["imageinfo"]) > 0:
-                    return page["imageinfo"][0].get("url")
+        query_string = urllib.parse.urlencode(params)
+        api_url = f"{MEDIAWIKI_BASE_URL.rsplit('/', 1)[0]}/api.php?{query_string}"
         
-        return None
+        try:
+            data = json.loads(_fetch_bytes(api_url).decode("utf-8"))
+        except Exception as e:
+            print(f"Error resolving image URLs from API: {e}")
+            continue
         
-    except Exception:
-        return None
+        query = data.get("query", {})
+        # Page titles come back normalized ("Файл:Img 1.png" for "File:img_1.png"),
+        # map them back to the titles that were asked for
+        normalized = {n.get("to"): n.get("from") for n in query.get("normalized", [])}
+        for page in query.get("pages", {}).values():
+            if not page.get("imageinfo"):
+                continue
+            title = page.get("title", "")
+            title = normalized.get(title, title)
+            filename = title.split(":", 1)[1] if ":" in title else title
+            info = page["imageinfo"][0]
+            if info.get("url"):
+                image_info[filename] = {
+                    "url": info["url"],
+                    "size": info.get("size"),
+                    "sha1": info.get("sha1"),
+                }
+    
+    return image_info
+
+
+def _existing_image(filename: str, assets_dir: Path) -> Path | None:
+    # Check both normalized (spaces -> underscores) and original names
+    for path in (assets_dir / filename.replace(' ', '_'), assets_dir / filename):
+        if path.exists():
+            return path
+    return None
 
 
-def download_image(filename: str, assets_dir: Path, dry_run: bool = False) -> bool:
-    """Download a single image from MediaWiki to assets directory."""
+def resolve_image_info(
+    filenames: Iterable[str], assets_dir: Path, verify: bool = False
+) -> dict[str, dict]:
+    """Build the shared download info map, see get_image_info_from_api.
+    
+    Only files missing from assets_dir are resolved, unless ``verify`` is set:
+    then existing files are looked up as well so that _download_image can
+    replace those whose size differs from the wiki's copy.
+    """
+    
+    wanted = [
+        f for f in dict.fromkeys(filenames)
+        if verify or _existing_image(f, assets_dir) is None
+    ]
+    if not wanted:
+        return {}
+    return get_image_info_from_api(wanted)
+
+
+def download_image(
+    filename: str,
+    assets_dir: Path,
+    dry_run: bool = False,
+    image_info: Mapping[str, dict] | None = None,
+) -> bool:
+    """Download a single image from MediaWiki to assets directory.
+    
+    With ``image_info`` (see resolve_image_info) the URL is taken from the map
+    instead of a separate API query.
+    """
+    
+    try:
+        message = _download_image(filename, assets_dir, dry_run, image_info)
+    except RuntimeError as e:
+        print(f"  {e}")
+        return False
+    if message:
+        print(message)
+    return True
+
+
+def _download_image(
+    filename: str,
+    assets_dir: Path,
+    dry_run: bool = False,
+    image_info: Mapping[str, dict] | None = None,
+) -> str:
+    """Download ``filename`` unless it is already present in ``assets_dir``.
+
+    Returns the progress message to report (empty when nothing was done) and
+    raises RuntimeError with a ready-to-print message on failure, so the same
+    code serves both the sequential and the ``--jobs`` download paths.
+    """
     
     # Normalize filename - MediaWiki replaces spaces with underscores in actual files
     normalized_filename = filename.replace(' ', '_')
-    
-    # Skip if already exists (check both original and normalized names)
     dest_path = assets_dir / normalized_filename
-    if dest_path.exists():
-        return True
+    info = image_info.get(filename) if image_info is not None else None
     
-    # Also check original name
-    orig_path = assets_dir / filename
-    if orig_path.exists():
-        return True
+    # Skip if already exists, unless the wiki reports a different size
+    # (e.g. a file truncated by an interrupted run of an older version)
+    existing = _existing_image(filename, assets_dir)
+    if existing is not None:
+        if not info or info.get("size") in (None, existing.stat().st_size):
+            return ""
+        dest_path = existing
     
     if dry_run:
-        print(f"  [DRY RUN] Would download: {filename}")
-        return True
+        return f"  [DRY RUN] Would download: {filename}"
     
-    # Get actual URL from API
-    url = get_image_url_from_api(filename)
+    # Get actual URL from the shared map or from the API
+    if image_info is not None:
+        url = info["url"] if info else None
+    else:
+        url = get_image_url_from_api(filename)
     
     if not url:
-        print(f"  Failed to get URL for {filename}")
-        return False
+        raise RuntimeError(f"Failed to get URL for {filename}")
     
     try:
-        with urllib.request.urlopen(url, timeout=30) as resp:
-            data = resp.read()
-        
         assets_dir.mkdir(parents=True, exist_ok=True)
-        # Save with normalized name (spaces -> underscores)
-        dest_path.write_bytes(data)
-        print(f"  Downloaded: {normalized_filename}")
-        return True
+        _download_file(
+            url,
+            dest_path,
+            size=info.get("size") if info else None,
+            sha1=info.get("sha1") if info else None,
+        )
         
     except urllib.error.HTTPError as e:
-        print(f"  Failed to download {filename}: HTTP {e.code}")
-        return False
-    except urllib.error.URLError as e:
-        print(f"  Failed to download {filename}: {e}")
-        return False
+        raise RuntimeError(f"Failed to download {filename}: HTTP {e.code}") from e
     except Exception as e:
-        print(f"  Failed to download {filename}: {e}")
-        return False
+        raise RuntimeError(f"Failed to download {filename}: {e}") from e
+    
+    if existing is not None:
+        return f"  Repaired: {dest_path.name}"
+    return f"  Downloaded: {normalized_filename}"
+
+
+def load_asset_aliases(assets_dir: Path) -> dict[str, str]:
+    """Load the {duplicate name: canonical name} map of ``assets_dir``."""
+
+    try:
+        data = json.loads((assets_dir / ASSET_ALIASES_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def canonical_asset(filename: str, aliases: Mapping[str, str]) -> str:
+    """Name under which ``filename`` is stored, ``filename`` unless a duplicate."""
+
+    return aliases.get(filename.replace(" ", "_"), filename)
+
+
+def apply_asset_aliases(markdown: str, aliases: Mapping[str, str]) -> str:
+    """Point references to duplicate assets at their canonical file."""
+
+    if not aliases or "assets/" not in markdown:
+        return markdown
+    # File names may contain parentheses, so the names themselves are matched
+    # (longest first), up to the end of a Markdown link or an HTML attribute
+    names = "|".join(re.escape(name) for name in sorted(aliases, key=len, reverse=True))
+    pattern = re.compile(rf'assets/({names})(?=[)"\s]|$)')
+    return pattern.sub(lambda match: "assets/" + aliases[match.group(1)], markdown)
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe_assets(assets_dir: Path, aliases: dict[str, str]) -> tuple[dict[str, str], int]:
+    """Keep a single copy of every distinct file in ``assets_dir``.
+
+    Files are grouped by size and only same-size files are hashed. Of
+    identical files the one other names already point at is kept, else the
+    shortest name (``Photo.jpg`` rather than ``Photo_(2).jpg``); the others
+    are deleted and recorded in ``aliases``, which is updated in place.
+
+    Returns the aliases added and the number of bytes freed.
+    """
+
+    by_size: dict[int, list[Path]] = {}
+    for path in assets_dir.iterdir():
+        # Skip the alias map and partial downloads
+        if path.name.startswith(".") or path.name.endswith(".part") or not path.is_file():
+            continue
+        by_size.setdefault(path.stat().st_size, []).append(path)
+
+    targets = set(aliases.values())
+    added: dict[str, str] = {}
+    freed = 0
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        by_digest: dict[str, list[str]] = {}
+        for path in paths:
+            by_digest.setdefault(_file_digest(path), []).append(path.name)
+        for names in by_digest.values():
+            if len(names) < 2:
+                continue
+            canonical = min(names, key=lambda name: (name not in targets, len(name), name))
+            for name in names:
+                if name == canonical:
+                    continue
+                (assets_dir / name).unlink()
+                freed += size
+                added[name] = canonical
+                # Names that pointed at the deleted copy follow it
+                for alias, target in aliases.items():
+                    if target == name:
+                        aliases[alias] = canonical
+    aliases.update(added)
+    return added, freed
+
+
+def finalize_markdown(
+    markdown: str,
+    aliases: Mapping[str, str],
+    variants: Mapping[str, Mapping],
+) -> str:
+    """Point a converted page at the stored assets and their variants."""
+
+    return image_variants.apply_variants(apply_asset_aliases(markdown, aliases), variants)
+
+
+def _process_assets(
+    assets_dir: Path,
+    docs_dir: Path,
+    aliases: dict[str, str],
+    lossless: bool = False,
+    workers: int = 1,
+) -> tuple[dict[str, dict], dict[Path, str]]:
+    """Post-process downloaded assets and report it.
+
+    Duplicates are removed (see dedupe_assets) and image variants brought up
+    to date (see image_variants). If either changed, pages already in
+    ``docs_dir`` are rewritten with finalize_markdown. Returns the image
+    variants and the rewritten pages with their new text.
+    """
+
+    if not assets_dir.is_dir():
+        return {}, {}
+    added, freed = dedupe_assets(assets_dir, aliases)
+    if added:
+        _save_json(assets_dir / ASSET_ALIASES_NAME, aliases)
+        print(f"Deduplicated {len(added)} asset(s), {freed:,} bytes freed")
+    if aliases:
+        saved = sum(
+            (assets_dir / target).stat().st_size
+            for target in aliases.values()
+            if (assets_dir / target).is_file()
+        )
+        print(f"Asset store: {len(aliases)} duplicate name(s), {saved:,} bytes saved")
+
+    if not image_variants.available():
+        print("Pillow is not installed, image variants are not updated")
+    variants, variants_changed = image_variants.update_variants(
+        assets_dir, IMAGE_VARIANTS_FILE, lossless, workers
+    )
+    if variants:
+        counts = {
+            kind: sum(bool(media.get(kind)) for media in variants.values())
+            for kind in ("original", "thumb", "web", "poster")
+        }
+        print(
+            f"Image variants: {counts['original']} sized image(s), "
+            f"{counts['thumb']} thumbnail(s), {counts['web']} web variant(s), "
+            f"{counts['poster']} video poster(s)"
+        )
+
+    rewritten: dict[Path, str] = {}
+    if added or variants_changed:
+        # Only runs when the store changed, which is rare
+        for md in sorted(docs_dir.rglob("*.md")):
+            if md.is_symlink() or not md.is_file():
+                continue
+            text = md.read_text(encoding="utf-8", errors="ignore")
+            new_text = finalize_markdown(text, aliases, variants)
+            if new_text != text:
+                md.write_text(new_text, encoding="utf-8")
+                rewritten[md] = new_text
+        print(f"Rewrote asset references in {len(rewritten)} page(s)")
+    return variants, rewritten
+
+
+class _InotifyWatcher:
+    """Names of the files changed in a directory, from Linux inotify."""
+
+    method = "inotify"
+    # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE: files written,
+    # renamed (editors save by renaming a temporary file) and deleted
+    _MASK = 0x008 | 0x040 | 0x080 | 0x200
+    _EVENT = struct.Struct("iIII")  # wd, mask, cookie, length of the name
+
+    def __init__(self, directory: Path) -> None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), self._MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"cannot watch {directory}")
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """Block until files change, empty after ``timeout`` seconds without changes."""
+
+        names: set[str] = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                *_, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                names.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+                offset += length
+            # A save is often several events, take them together
+            ready, _, _ = select.select([self._fd], [], [], WATCH_SETTLE)
+        return names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    """Names of the files changed in a directory, from scanning their size and mtime."""
+
+    method = "polling"
+
+    def __init__(self, directory: Path, interval: float = WATCH_POLL_INTERVAL) -> None:
+        self.directory = directory
+        self.interval = interval
+        self._files = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """Block until files change, empty after ``timeout`` seconds without changes."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval)
+            files = self._scan()
+            changed = {
+                name
+                for name in files.keys() | self._files.keys()
+                if files.get(name) != self._files.get(name)
+            }
+            self._files = files
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+def _directory_watcher(directory: Path, poll: bool = False) -> _InotifyWatcher | _PollingWatcher:
+    """Watch ``directory`` with inotify where available, by polling otherwise."""
+
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available ({e}), polling instead")
+    return _PollingWatcher(directory)
+
+
+def _reconvert_sources(
+    names: Iterable[str],
+    manifest_pages: dict[str, dict],
+    engine: str,
+    expander: TemplateExpander | None,
+    asset_aliases: Mapping[str, str],
+    variants: Mapping[str, Mapping],
+) -> list[str]:
+    """Bring the pages of changed sources in MEDIAWIKI_DIR up to date, for --watch.
+
+    Pages using a template whose source changed are converted as well, and
+    ``manifest_pages`` is updated. Outputs are only written if their text
+    changed. Returns the outputs written or deleted, relative to DOCS_DIR.
+    """
+
+    names = set(names)
+    if expander is not None:
+        # Sources of templates are read again, with the revision check of
+        # a full run finding the pages that use a changed one
+        expander.forget()
+        names.update(
+            name
+            for name, entry in manifest_pages.items()
+            if any(
+                expander.revision(template) != revision
+                for template, revision in entry.get("templates", {}).items()
+            )
+        )
+
+    written: list[str] = []
+    for name in sorted(names):
+        src = MEDIAWIKI_DIR / name
+        dst = DOCS_DIR / f"{src.stem}.md"
+        if not src.is_file():
+            if manifest_pages.pop(name, None) is not None and dst.is_file():
+                dst.unlink()
+                print(f"Deleted {dst.relative_to(ROOT)} ({name} was removed)")
+                written.append(dst.relative_to(DOCS_DIR).as_posix())
+            continue
+
+        raw = src.read_text(encoding="utf-8", errors="ignore")
+        source_hash = _hash_text(raw)
+        if _is_up_to_date(manifest_pages.get(name), source_hash, dst, expander):
+            continue
+        used: dict[str, str] = {}
+        result = convert_page(raw if expander is None else expander.expand(raw, used), engine)
+        # New images are downloaded, variants of them are made on the next full run
+        images = list(dict.fromkeys(canonical_asset(img, asset_aliases) for img in result.assets))
+        image_info = resolve_image_info(images, ASSETS_DIR)
+        for img in images:
+            download_image(img, ASSETS_DIR, image_info=image_info)
+
+        md_text = finalize_markdown(result.markdown, asset_aliases, variants)
+        manifest_pages[name] = _manifest_entry(source_hash, dst, _hash_text(md_text), result, used)
+        if dst.is_file() and dst.read_text(encoding="utf-8", errors="ignore") == md_text:
+            print(f"Output of {name} did not change")
+            continue
+        dst.write_text(md_text, encoding="utf-8")
+        print(f"Converted {src.relative_to(ROOT)} -> {dst.relative_to(ROOT)}")
+        written.append(dst.relative_to(DOCS_DIR).as_posix())
+    return written
+
+
+def _check_affected_pages(outputs: Iterable[str], graph: Mapping) -> None:
+    """Check the links of changed pages and of the pages linking to them, for --watch.
+
+    Pages are checked from their targets in the link graph, as
+    ``validate_docs.py --link-graph`` does.
+    """
+
+    affected = dict.fromkeys(outputs)
+    for page in list(affected):
+        affected.update(dict.fromkeys(graph["backlinks"].get(page, [])))
+
+    errors: list[str] = []
+    warnings: list[str] = []
+    checked = 0
+    for page in affected:
+        refs = graph["pages"].get(page)
+        if refs is None:
+            continue
+        page_errors, page_warnings = validate_docs.check_targets(
+            DOCS_DIR / page, validate_docs.graph_targets(refs)
+        )
+        errors.extend(page_errors)
+        warnings.extend(page_warnings)
+        checked += 1
+    print(f"Checked {checked} page(s): {len(errors)} error(s), {len(warnings)} warning(s)")
+    for message in errors + warnings:
+        print(f"  {message}")
+
+
+def _watch(
+    engine: str,
+    version: str,
+    expander: TemplateExpander | None,
+    asset_aliases: Mapping[str, str],
+    variants: Mapping[str, Mapping],
+    poll: bool = False,
+) -> int:
+    """Reconvert pages as their sources in MEDIAWIKI_DIR change, until interrupted.
+
+    The manifest and the link graph of the full run that came before are
+    kept up to date after every change.
+    """
+
+    manifest_pages = _load_manifest(MANIFEST_FILE)["pages"]
+    watcher = _directory_watcher(MEDIAWIKI_DIR, poll)
+    print(f"Watching {MEDIAWIKI_DIR} for changes ({watcher.method}), press Ctrl+C to stop")
+    try:
+        while True:
+            names = {name for name in watcher.wait() if name.endswith(".mediawiki")}
+            if not names:
+                continue
+            started = time.perf_counter()
+            written = _reconvert_sources(
+                names, manifest_pages, engine, expander, asset_aliases, variants
+            )
+            _save_json(MANIFEST_FILE, {"converter": version, "pages": manifest_pages})
+            graph = _save_link_graph(manifest_pages, asset_aliases)
+            if written:
+                _check_affected_pages(written, graph)
+                print(f"Updated in {(time.perf_counter() - started) * 1000:.0f} ms")
+    except KeyboardInterrupt:
+        print()
+        return 0
+    finally:
+        watcher.close()
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -899,7 +2929,165 @@ def main(argv: list[str] | None = None) -> int:
         ),
     )
 
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default=ENGINES[0],
+        help=(
+            "Conversion engine: the legacy pipeline of sequential passes "
+            "(default) or the single-pass engine, which walks each page once "
+            "and produces the same output."
+        ),
+    )
+
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help=(
+            "In --remote mode fetch only pages whose revision changed since the "
+            "last sync, and delete pages removed from the wiki. The revision of "
+            "each page is kept in .cache/remote_sync.json."
+        ),
+    )
+
+    parser.add_argument(
+        "--verify-assets",
+        action="store_true",
+        help=(
+            "Also look up images that already exist in docs/assets and download "
+            "them again if their size differs from the file on the wiki."
+        ),
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=(
+            "Reconvert all local pages even if the manifest in .cache/ says "
+            "that their source and the converter did not change."
+        ),
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Number of parallel requests in --remote mode for fetching pages "
+            "and downloading images. Output order does not depend on it. "
+            "Default: 1."
+        ),
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Number of processes converting pages in local mode. Output order "
+            "does not depend on it. Default: 1."
+        ),
+    )
+    parser.add_argument(
+        "--lossless-images",
+        action="store_true",
+        help=(
+            "Only re-encode images losslessly when making their web variants "
+            "(gallery thumbnails are always resized). Needs Pillow."
+        ),
+    )
+
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=MAX_REQUESTS_PER_HOST,
+        metavar="N",
+        help=(
+            "Maximum number of simultaneous requests to a single host. "
+            f"Default: {MAX_REQUESTS_PER_HOST}."
+        ),
+    )
+
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=MAX_REQUESTS_PER_HOST,
+        metavar="N",
+        help=(
+            "Number of idle keep-alive connections kept open per host. "
+            f"Default: {MAX_REQUESTS_PER_HOST}."
+        ),
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=HTTP_RETRIES,
+        metavar="N",
+        help=(
+            "How many times a request is retried after a network error or a "
+            f"429/5xx answer, with exponential backoff. Default: {HTTP_RETRIES}."
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Answer every wiki request (raw pages, API queries) from the "
+            "response cache in .cache/http/ without using the network. Requests "
+            "never made online fail, as do downloads of images missing from "
+            "docs/assets."
+        ),
+    )
+    parser.add_argument(
+        "--no-http-cache",
+        action="store_true",
+        help=(
+            "Neither use nor update the response cache. By default responses "
+            "are cached and revalidated with conditional requests."
+        ),
+    )
+
+    parser.add_argument(
+        "--no-templates",
+        action="store_true",
+        help=(
+            "Leave {{...}} template calls as written. By default templates are "
+            "expanded with their sources from mediawiki/ (Шаблон_Name.mediawiki) "
+            "or, with --remote, from the wiki."
+        ),
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "After converting, keep watching mediawiki/ and reconvert a page as "
+            "soon as its source or a template it uses changes. Only outputs "
+            "whose text changed are written, then the links of the changed "
+            "pages and of the pages linking to them are checked. Uses inotify "
+            "on Linux. Stop with Ctrl+C."
+        ),
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help=(
+            f"With --watch, scan mediawiki/ every {WATCH_POLL_INTERVAL} s instead "
+            "of using inotify, e.g. for network or container mounts."
+        ),
+    )
+
     args = parser.parse_args(argv)
+    if args.offline and args.no_http_cache:
+        parser.error("--offline needs the response cache, drop --no-http-cache")
+    if args.watch and (args.remote or args.input or args.dry_run):
+        parser.error("--watch works on a full local run, without --remote, input or --dry-run")
+    _HOST_LIMITER.reset(args.per_host)
+    _HTTP_CLIENT.reset(args.pool_size, args.retries)
+    _RESPONSE_CACHE.reset(None if args.no_http_cache else HTTP_CACHE_DIR, args.offline)
 
     DOCS_DIR.mkdir(parents=True, exist_ok=True)
     ASSETS_DIR.mkdir(parents=True, exist_ok=True)
@@ -946,17 +3134,106 @@ def main(argv: list[str] | None = None) -> int:
                     dst.write_text(redirect_content, encoding="utf-8")
                     print(f"Created redirect {redirect_title!r} -> {target_title!r}")
 
-        for title in pages:
-            if not title:
-                continue
-            try:
-                raw = fetch_page_raw(title)
-            except Exception as e:  # noqa: BLE001 - log and continue
-                print(f"Failed to fetch {title!r}: {e}")
+        failures: list[tuple[str, Exception]] = []
+
+        titles = [title for title in pages if title]
+
+        # With --sync only pages whose revision changed since the last run are
+        # fetched; pages that were deleted or turned into redirects are dropped
+        sync_state: dict = {}
+        revisions: dict[str, dict | None] = {}
+        # The references of every page for the link graph, the pages skipped
+        # by --sync keep those recorded when they were converted
+        page_refs: dict[str, dict] = {}
+        if args.sync:
+            sync_state = _load_sync_state(SYNC_STATE_FILE)
+            known: dict[str, int] = sync_state["pages"]
+            known_templates: dict[str, dict[str, str]] = sync_state.setdefault("templates", {})
+            page_refs = sync_state.setdefault("refs", {})
+            if sync_state.get("timestamp"):
+                print(f"Last sync: {sync_state['timestamp']}")
+            print("Fetching page revisions...")
+            revisions = get_latest_revisions([*titles, *known])
+            # A page is also fetched again when a template it uses changed
+            template_revisions: dict[str, str] = {}
+            if not args.no_templates:
+                names = {name for used in known_templates.values() for name in used}
+                found = get_latest_revisions(f"{TEMPLATE_NAMESPACE}:{name}" for name in sorted(names))
+                for template, info in found.items():
+                    revision = "" if info is None else str(info["revid"])
+                    template_revisions[template.partition(":")[2]] = revision
+            requested = set(titles)
+            to_fetch: list[str] = []
+            unchanged = removed = 0
+            for title in dict.fromkeys([*titles, *known]):
+                info = revisions.get(title, {})
+                dst = DOCS_DIR / f"{sanitize_title_to_filename(title)}.md"
+                if info is None or (info and info["redirect"]):
+                    # Deleted, or now a redirect written by the redirect step above
+                    if title in known:
+                        removed += 1
+                        del known[title]
+                        known_templates.pop(title, None)
+                        page_refs.pop(title, None)
+                        if info is None and dst.exists() and not args.dry_run:
+                            dst.unlink()
+                            print(f"Deleted {dst.relative_to(ROOT)} ({title!r} was deleted)")
+                    continue
+                if title not in requested:
+                    continue
+                if (
+                    info
+                    and known.get(title) == info["revid"]
+                    # A state without the refs of the page cannot give its links
+                    and title in page_refs
+                    and dst.exists()
+                    and all(
+                        template_revisions.get(name, revision) == revision
+                        for name, revision in known_templates.get(title, {}).items()
+                    )
+                ):
+                    unchanged += 1
+                    continue
+                to_fetch.append(title)
+            print(
+                f"Sync: {len(to_fetch)} changed, {unchanged} unchanged, "
+                f"{removed} removed page(s)"
+            )
+            titles = to_fetch
+
+        # Fetch all pages first; results come back in the order of `pages`
+        fetched: list[tuple[str, str]] = []
+        for title, (raw, error) in zip(
+            titles, _run_parallel(fetch_page_raw, titles, args.jobs)
+        ):
+            if error is not None:
+                print(f"Failed to fetch {title!r}: {error}")
+                failures.append((f"page {title!r}", error))
                 continue
-
-            # Extract and download images
-            images = extract_image_filenames(raw)
+            fetched.append((title, raw))
+
+        # Templates are expanded first, the templates the pages call directly
+        # are looked up in a few batched queries
+        expander: TemplateExpander | None = None
+        used_templates: list[dict[str, str]] = [{} for _ in fetched]
+        if not args.no_templates:
+            remote_templates = _RemoteTemplates()
+            remote_templates.prefetch(name for _, raw in fetched for name in template_names(raw))
+            expander = TemplateExpander(remote_templates)
+            fetched = [
+                (title, expander.expand(raw, used))
+                for (title, raw), used in zip(fetched, used_templates)
+            ]
+            _report_templates(expander)
+
+        # Convert first, conversion also lists the images of every page; each
+        # file is downloaded once even if used on several pages
+        conversions = [convert_page(raw, args.engine) for _, raw in fetched]
+        # Duplicates are downloaded under the name of the stored copy
+        asset_aliases = load_asset_aliases(ASSETS_DIR)
+        all_images: dict[str, None] = {}
+        for (title, _), result in zip(fetched, conversions):
+            images = list(dict.fromkeys(canonical_asset(img, asset_aliases) for img in result.assets))
             if images:
                 if args.dry_run:
                     print(f"Found {len(images)} image(s) in {title!r}:")
@@ -964,10 +3241,31 @@ def main(argv: list[str] | None = None) -> int:
                         print(f"  - {img}")
                 else:
                     print(f"Found {len(images)} image(s) in {title!r}")
-                    for img in images:
-                        download_image(img, ASSETS_DIR, args.dry_run)
-
-            md_text = convert_text(raw)
+                    all_images.update(dict.fromkeys(images))
+
+        if all_images:
+            filenames = list(all_images)
+            image_info = resolve_image_info(filenames, ASSETS_DIR, args.verify_assets)
+            results = _run_parallel(
+                lambda img: _download_image(img, ASSETS_DIR, image_info=image_info),
+                filenames,
+                args.jobs,
+            )
+            for img, (message, error) in zip(filenames, results):
+                if error is not None:
+                    print(f"  {error}")
+                    failures.append((f"image {img!r}", error))
+                elif message:
+                    print(message)
+
+        variants: dict[str, dict] = {}
+        if not args.dry_run:
+            variants, _ = _process_assets(
+                ASSETS_DIR, DOCS_DIR, asset_aliases, args.lossless_images, args.workers
+            )
+
+        for (title, _), result, used in zip(fetched, conversions, used_templates):
+            md_text = finalize_markdown(result.markdown, asset_aliases, variants)
             base_name = sanitize_title_to_filename(title)
             dst = DOCS_DIR / f"{base_name}.md"
 
@@ -977,6 +3275,24 @@ def main(argv: list[str] | None = None) -> int:
 
             dst.write_text(md_text, encoding="utf-8")
             print(f"Converted remote page {title!r} -> {dst.relative_to(ROOT)}")
+            page_refs[title] = _page_refs_entry(dst, result)
+            info = revisions.get(title)
+            if info:
+                sync_state["pages"][title] = info["revid"]
+                sync_state["templates"][title] = used
+
+        if args.sync and not args.dry_run:
+            sync_state["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            _save_json(SYNC_STATE_FILE, sync_state)
+
+        # A single --input page is not the whole site, the graph is kept
+        if not args.input and not args.dry_run:
+            _print_link_graph(_save_link_graph(page_refs, asset_aliases))
+
+        if failures:
+            print(f"\n{len(failures)} failure(s):")
+            for what, error in failures:
+                print(f"  {what}: {error}")
 
         # Create index.md symlink to main page
         index_path = DOCS_DIR / "index.md"
@@ -1003,13 +3319,82 @@ def main(argv: list[str] | None = None) -> int:
         print("No .mediawiki files found to convert.")
         return 0
 
-    for src in src_paths:
-        if not src.is_file():
+    # A full run over mediawiki/ is incremental: pages whose source, output
+    # and converter are unchanged since the last run are skipped
+    incremental = not args.input
+    version = converter_version(args.engine, not args.no_templates)
+    expander = None if args.no_templates else TemplateExpander(_LocalTemplates(MEDIAWIKI_DIR))
+    manifest = _load_manifest(MANIFEST_FILE) if incremental else {"pages": {}}
+    # Entries are only trusted for the same converter version; --force ignores them
+    old_pages: dict[str, dict] = {}
+    if manifest.get("converter") == version and not args.force:
+        old_pages = manifest["pages"]
+    new_pages: dict[str, dict] = {}
+    skipped = converted = deleted = 0
+
+    # Duplicates are downloaded under the name of the stored copy
+    asset_aliases = load_asset_aliases(ASSETS_DIR)
+    # Pages are written with the variants of the last run as they are
+    # converted; _process_assets rewrites them below if the downloads
+    # change the asset store
+    variants = image_variants.load_variants(IMAGE_VARIANTS_FILE)
+
+    # Pages are read, converted (in a process pool with --workers) and
+    # written one after the other in source order. Images of converted
+    # pages come with their conversion, those of skipped pages from the
+    # manifest; all URLs are then resolved with a few batched API queries
+    # instead of one per image
+    output = Path(args.output).resolve() if args.output and len(src_paths) == 1 else None
+    page_images: list[tuple[Path, list[str]]] = []
+    output_names: dict[Path, str] = {}
+    for page in _convert_local_pages(
+        src_paths, output, old_pages, expander, args.engine, args.workers
+    ):
+        src, dst, entry, result = page.src, page.dst, page.entry, page.result
+        output_names[dst] = src.name
+        if page.stream and entry is None:
+            # Too large to be held whole: converted and written piece by piece
+            result, output_hash = convert_file_streaming(
+                src,
+                None if args.dry_run else dst,
+                lambda markdown: finalize_markdown(markdown, asset_aliases, variants),
+            )
+        images = result.assets if result is not None else entry.get("assets", [])
+        images = list(dict.fromkeys(canonical_asset(img, asset_aliases) for img in images))
+        page_images.append((src, images))
+
+        if entry is not None:
+            new_pages[src.name] = entry
+            skipped += 1
             continue
 
-        # Read source and extract images
-        raw = src.read_text(encoding="utf-8", errors="ignore")
-        images = extract_image_filenames(raw)
+        src_rel = src.relative_to(ROOT) if src.is_relative_to(ROOT) else src
+        dst_rel = dst.relative_to(ROOT) if dst.is_relative_to(ROOT) else dst
+        converted += 1
+
+        if args.dry_run:
+            print(f"[DRY RUN] {src_rel} -> {dst_rel}")
+            continue
+
+        if not page.stream:
+            md_text = finalize_markdown(result.markdown, asset_aliases, variants)
+            dst.write_text(md_text, encoding="utf-8")
+            output_hash = _hash_text(md_text)
+        new_pages[src.name] = _manifest_entry(
+            page.source_hash, dst, output_hash, result, page.templates
+        )
+        print(f"Converted {src_rel} -> {dst_rel}")
+    _report_templates(expander)
+
+    image_info: dict[str, dict] = {}
+    if not args.dry_run:
+        image_info = resolve_image_info(
+            (img for _, images in page_images for img in images),
+            ASSETS_DIR,
+            args.verify_assets,
+        )
+
+    for src, images in page_images:
         if images:
             if args.dry_run:
                 print(f"Found {len(images)} image(s) in {src.name}:")
@@ -1018,27 +3403,36 @@ def main(argv: list[str] | None = None) -> int:
             else:
                 print(f"Found {len(images)} image(s) in {src.name}")
                 for img in images:
-                    download_image(img, ASSETS_DIR, args.dry_run)
-
-        # Determine output path
-        base_name = src.stem
-        if args.output and len(src_paths) == 1:
-            dst = Path(args.output).resolve()
-        else:
-            dst = DOCS_DIR / f"{base_name}.md"
+                    download_image(img, ASSETS_DIR, args.dry_run, image_info)
 
-        md_text = convert_text(raw)
-
-        if args.dry_run:
-            src_rel = src.relative_to(ROOT) if src.is_relative_to(ROOT) else src
-            dst_rel = dst.relative_to(ROOT) if dst.is_relative_to(ROOT) else dst
-            print(f"[DRY RUN] {src_rel} -> {dst_rel}")
-            continue
+    if not args.dry_run:
+        variants, rewritten = _process_assets(
+            ASSETS_DIR, DOCS_DIR, asset_aliases, args.lossless_images, args.workers
+        )
+        for dst, md_text in rewritten.items():
+            name = output_names.get(dst)
+            if name in new_pages:
+                new_pages[name] = {**new_pages[name], "output_hash": _hash_text(md_text)}
+
+    if incremental:
+        # Remove outputs of sources that no longer exist
+        for name, entry in sorted(manifest["pages"].items()):
+            if name in new_pages or (MEDIAWIKI_DIR / name).is_file():
+                continue
+            dst = ROOT / entry.get("output", "")
+            deleted += 1
+            if args.dry_run:
+                print(f"[DRY RUN] Would delete {entry.get('output')} ({name} was removed)")
+                continue
+            if dst.is_file():
+                dst.unlink()
+                print(f"Deleted {entry.get('output')} ({name} was removed)")
 
-        dst.write_text(md_text, encoding="utf-8")
-        src_rel = src.relative_to(ROOT) if src.is_relative_to(ROOT) else src
-        dst_rel = dst.relative_to(ROOT) if dst.is_relative_to(ROOT) else dst
-        print(f"Converted {src_rel} -> {dst_rel}")
+        print(f"Skipped {skipped}, converted {converted}, deleted {deleted} page(s)")
+        if not args.dry_run:
+            _save_json(MANIFEST_FILE, {"converter": version, "pages": new_pages})
+            graph = _save_link_graph(new_pages, asset_aliases)
+            _print_link_graph(graph)
 
     # Create index.md symlink to main page
     index_path = DOCS_DIR / "index.md"
@@ -1049,6 +3443,8 @@ def main(argv: list[str] | None = None) -> int:
         index_path.symlink_to("Заглавная_страница.md")
         print(f"Created index.md -> Заглавная_страница.md")
 
+    if args.watch:
+        return _watch(args.engine, version, expander, asset_aliases, variants, args.poll)
     return 0
 
 
@@ -0,0 +1,338 @@
+"""Web variants of the images and videos in docs/assets.
+
+Two variants are made of every PNG, JPEG and WebP image:
+
+- ``thumbs/<name>``: a gallery thumbnail, THUMB_WIDTH pixels wide;
+- ``web/<name>``: a copy bounded to WEB_MAX_SIZE pixels and recompressed,
+  shown inline on pages instead of the original.
+
+A variant is only kept if it is smaller than the original, pages keep
+linking the original otherwise. With ``lossless`` the web variants are only
+re-encoded losslessly (optimized PNG, lossless WebP) and never resized, and
+JPEGs get no web variant. The pixel size of every image and variant is
+recorded, so that pages can give images their intrinsic size. Videos get a
+poster frame, ``posters/<name>.jpg``.
+
+Results are cached by the content hash of each file, so only new or changed
+files are processed, in a pool of processes. Pillow (images) and ffmpeg
+(posters) are optional: without them nothing new is made of those files and
+pages link what exists.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Mapping
+
+from wiki_patterns import VIDEO_EXTENSIONS, file_extension
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = ImageOps = None
+
+THUMB_DIR = "thumbs"
+WEB_DIR = "web"
+POSTER_DIR = "posters"
+THUMB_WIDTH = 400  # galleries show 200 CSS pixels, twice that for dense screens
+WEB_MAX_SIZE = 1600  # longest edge
+POSTER_MAX_WIDTH = 1280
+POSTER_TIME = 1.0  # seconds into the video, the first frame is often black
+QUALITY = 82
+# Images whose pixel size is recorded; GIFs may be animated and are left
+# alone otherwise, SVGs have no pixel size
+SIZED_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "webp", "gif", "bmp"})
+VARIANT_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "webp"})
+
+# File names may contain balanced parentheses, as in ``Photo_(2).jpg``
+_MARKDOWN_IMAGE_PATTERN = re.compile(
+    r"(!\[[^\]\n]*\]\(assets/)(?:web/)?"
+    r"((?:[^()\n]|\([^()\n]*\))+?\.(?:png|jpe?g|webp|gif|bmp|svg))\)"
+    r"(?:\{ loading=lazy[^}\n]*\})?",
+    re.IGNORECASE,
+)
+_HTML_IMAGE_PATTERN = re.compile(r'<img src="assets/(?:thumbs/)?([^"]+)"([^>]*?)\s*/?>')
+_GENERATED_IMAGE_ATTR_PATTERN = re.compile(r' (?:height|loading|decoding)="[^"]*"')
+_WIDTH_ATTR_PATTERN = re.compile(r' width="(\d+)"')
+_VIDEO_PATTERN = re.compile(r'<video ([^>]*?)(?: poster="[^"]*")?>(<source src="assets/([^"]+)")')
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _ffmpeg() -> str | None:
+    return shutil.which("ffmpeg")
+
+
+def _settings(lossless: bool) -> str:
+    # Cached results are only valid for the same settings and tools
+    version = getattr(Image, "__version__", "") if Image is not None else ""
+    tools = f"{version}/{int(_ffmpeg() is not None)}"
+    return f"{THUMB_WIDTH}/{WEB_MAX_SIZE}/{POSTER_TIME}/{QUALITY}/{int(lossless)}/{tools}"
+
+
+def _digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save(image: "Image.Image", dest: Path, fmt: str, lossless: bool) -> None:
+    if fmt == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options = {"quality": QUALITY, "optimize": True, "progressive": True}
+    elif fmt == "WEBP":
+        options = {"lossless": True} if lossless else {"quality": QUALITY}
+    else:
+        options = {"optimize": True}
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    image.save(tmp, fmt, **options)
+    tmp.replace(dest)
+
+
+def _keep_if_smaller(dest: Path, original_size: int, size: tuple[int, int]) -> list[int] | None:
+    if dest.stat().st_size < original_size:
+        return list(size)
+    dest.unlink()
+    return None
+
+
+def make_variants(src: Path, assets_dir: Path, lossless: bool = False) -> dict:
+    """Write the variants of the image ``src``.
+
+    Returns the pixel sizes of the original and of the kept variants,
+    ``{"original": [w, h], "thumb": [w, h] or None, "web": [w, h] or None}``.
+    """
+
+    original_size = src.stat().st_size
+    result: dict = {"original": None, "thumb": None, "web": None}
+    with Image.open(src) as opened:
+        fmt = opened.format
+        image = ImageOps.exif_transpose(opened)
+        result["original"] = list(image.size)
+        if file_extension(src.name) not in VARIANT_EXTENSIONS:
+            return result
+        if image.mode == "P":
+            # Resample colors, not palette indexes
+            image = image.convert("RGBA")
+
+        if image.width > THUMB_WIDTH:
+            height = max(1, round(image.height * THUMB_WIDTH / image.width))
+            thumb = image.resize((THUMB_WIDTH, height), Image.Resampling.LANCZOS)
+            dest = assets_dir / THUMB_DIR / src.name
+            # Thumbnails are previews, they are never lossless
+            _save(thumb, dest, fmt, lossless=False)
+            result["thumb"] = _keep_if_smaller(dest, original_size, thumb.size)
+
+        if not (lossless and fmt == "JPEG"):
+            web = image
+            if not lossless and max(image.size) > WEB_MAX_SIZE:
+                web = image.copy()
+                web.thumbnail((WEB_MAX_SIZE, WEB_MAX_SIZE), Image.Resampling.LANCZOS)
+            dest = assets_dir / WEB_DIR / src.name
+            _save(web, dest, fmt, lossless)
+            result["web"] = _keep_if_smaller(dest, original_size, web.size)
+    return result
+
+
+def make_poster(src: Path, assets_dir: Path) -> dict:
+    """Write a poster frame of the video ``src``, ``{"poster": kept}``."""
+
+    dest = assets_dir / POSTER_DIR / f"{src.name}.jpg"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp.jpg")
+    # Videos shorter than POSTER_TIME get their first frame
+    for seek in (POSTER_TIME, 0):
+        subprocess.run(
+            [
+                _ffmpeg() or "ffmpeg", "-loglevel", "error", "-y",
+                "-ss", str(seek), "-i", str(src), "-frames:v", "1",
+                "-vf", f"scale='min({POSTER_MAX_WIDTH},iw)':-2", "-q:v", "4", str(tmp),
+            ],
+            check=True,
+            capture_output=True,
+            timeout=120,
+        )
+        if tmp.is_file() and tmp.stat().st_size:
+            tmp.replace(dest)
+            return {"poster": True}
+    return {"poster": False}
+
+
+def _process(task: tuple[Path, Path, bool]) -> tuple[dict | None, str]:
+    src, assets_dir, lossless = task
+    try:
+        if file_extension(src.name) in VIDEO_EXTENSIONS:
+            return make_poster(src, assets_dir), ""
+        return make_variants(src, assets_dir, lossless), ""
+    except Exception as e:  # a broken file must not stop the others
+        return None, f"Could not make variants of {src.name}: {e}"
+
+
+def _variant_files(assets_dir: Path, name: str, media: Mapping) -> list[Path]:
+    paths = []
+    if media.get("thumb"):
+        paths.append(assets_dir / THUMB_DIR / name)
+    if media.get("web"):
+        paths.append(assets_dir / WEB_DIR / name)
+    if media.get("poster"):
+        paths.append(assets_dir / POSTER_DIR / f"{name}.jpg")
+    return paths
+
+
+def update_variants(
+    assets_dir: Path, cache_file: Path, lossless: bool = False, workers: int = 1
+) -> tuple[dict[str, dict], bool]:
+    """Bring the variants of ``assets_dir`` up to date.
+
+    Returns what is known of every image and video (see make_variants and
+    make_poster) and whether that changed since the last run. Variants of
+    files that are gone are deleted.
+    """
+
+    settings = _settings(lossless)
+    try:
+        cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+    old_files: dict[str, dict] = cache.get("files", {})
+    trusted = old_files if cache.get("settings") == settings else {}
+    can_process = {"image": available(), "video": _ffmpeg() is not None}
+
+    files: dict[str, dict] = {}
+    tasks: list[tuple[Path, Path, bool]] = []
+    for src in sorted(assets_dir.iterdir()):
+        extension = file_extension(src.name)
+        if extension in SIZED_EXTENSIONS:
+            kind = "image"
+        elif extension in VIDEO_EXTENSIONS:
+            kind = "video"
+        else:
+            continue
+        if not src.is_file():
+            continue
+        stat = src.stat()
+        stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry = trusted.get(src.name)
+        if not can_process[kind]:
+            # Nothing new can be made, what exists stays linked
+            old = old_files.get(src.name)
+            if old and all(path.is_file() for path in _variant_files(assets_dir, src.name, old.get("media", {}))):
+                files[src.name] = old
+            continue
+        if entry and all(entry.get(key) == value for key, value in stamp.items()):
+            digest = entry["sha256"]
+        else:
+            digest = _digest(src)
+        if not (
+            entry
+            and entry.get("sha256") == digest
+            and all(path.is_file() for path in _variant_files(assets_dir, src.name, entry.get("media", {})))
+        ):
+            entry = None
+            tasks.append((src, assets_dir, lossless))
+        files[src.name] = {**(entry or {"media": {}}), **stamp, "sha256": digest}
+
+    if tasks:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(_process, tasks))
+        else:
+            results = [_process(task) for task in tasks]
+        for (src, _, _), (media, error) in zip(tasks, results):
+            if error:
+                print(error)
+            files[src.name]["media"] = media or {}
+
+    # Drop variants that are no longer kept or whose original is gone
+    wanted = {
+        path for name, entry in files.items()
+        for path in _variant_files(assets_dir, name, entry["media"])
+    }
+    for folder in (THUMB_DIR, WEB_DIR, POSTER_DIR):
+        variant_dir = assets_dir / folder
+        if variant_dir.is_dir():
+            for path in variant_dir.iterdir():
+                if path not in wanted:
+                    path.unlink()
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_name(cache_file.name + ".tmp")
+    tmp.write_text(
+        json.dumps({"settings": settings, "files": files}, ensure_ascii=False, indent=1),
+        encoding="utf-8",
+    )
+    tmp.replace(cache_file)
+    media = {name: entry["media"] for name, entry in files.items()}
+    old_media = {name: entry.get("media") for name, entry in old_files.items()}
+    return media, media != old_media
+
+
+def load_variants(cache_file: Path) -> dict[str, dict]:
+    """What the last :func:`update_variants` knew of every image and video."""
+
+    try:
+        cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    files = cache.get("files") if isinstance(cache, dict) else None
+    if not isinstance(files, dict):
+        return {}
+    return {name: entry["media"] for name, entry in files.items() if "media" in entry}
+
+
+def apply_variants(markdown: str, media: Mapping[str, Mapping]) -> str:
+    """Point a page at the variants in ``media`` (see update_variants).
+
+    Inline images link their web variant and gallery images their thumbnail,
+    gallery links (``<a href>``) keep the original. Images are lazy-loaded
+    and given their intrinsic size where it is known, videos link their
+    poster frame. References to variants that are no longer kept go back to
+    the original, so a page can be rewritten any number of times.
+    """
+
+    if "assets/" not in markdown:
+        return markdown
+
+    def inline_repl(match: re.Match[str]) -> str:
+        name = match.group(2)
+        info = media.get(name, {})
+        folder = f"{WEB_DIR}/" if info.get("web") else ""
+        size = info.get("web") or info.get("original")
+        dims = f" width={size[0]} height={size[1]}" if size else ""
+        return f"{match.group(1)}{folder}{name}){{ loading=lazy decoding=async{dims} }}"
+
+    def html_repl(match: re.Match[str]) -> str:
+        name = match.group(1)
+        info = media.get(name, {})
+        folder = f"{THUMB_DIR}/" if info.get("thumb") else ""
+        attrs = _GENERATED_IMAGE_ATTR_PATTERN.sub("", match.group(2))
+        width = _WIDTH_ATTR_PATTERN.search(attrs)
+        size = info.get("original")
+        if width and size:
+            # The shown width is fixed, the height keeps the aspect ratio
+            attrs += f' height="{max(1, round(int(width.group(1)) * size[1] / size[0]))}"'
+        return f'<img src="assets/{folder}{name}"{attrs} loading="lazy" decoding="async" />'
+
+    def video_repl(match: re.Match[str]) -> str:
+        attrs, source, name = match.groups()
+        if media.get(name, {}).get("poster"):
+            attrs += f' poster="assets/{POSTER_DIR}/{name}.jpg"'
+        return f"<video {attrs}>{source}"
+
+    markdown = _MARKDOWN_IMAGE_PATTERN.sub(inline_repl, markdown)
+    markdown = _HTML_IMAGE_PATTERN.sub(html_repl, markdown)
+    return _VIDEO_PATTERN.sub(video_repl, markdown)
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
+import json
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 DOCS_DIR = ROOT / "docs"
+CACHE_FILE = ROOT / ".cache" / "validate_docs.json"
+# Written by convert_mediawiki_to_md.py on full local runs
+LINK_GRAPH_FILE = ROOT / ".cache" / "link_graph.json"
 
 # Markdown link patterns
 # For images, match until file extension + closing paren
@@ -50,59 +57,263 @@ def find_case_insensitive(p: Path) -> Path | None:
     return None
 
 
-def check_file(md: Path) -> tuple[list[str], list[str]]:
+class DocsIndex:
+    """In-memory listing of a directory tree (docs/ including docs/assets).
+
+    Built once per run so that existence and case-mismatch checks are dict
+    lookups instead of a stat() and a directory scan per link. Paths outside
+    the indexed tree are checked on the filesystem as before.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.paths: set[Path] = {root}
+        self.folded: dict[tuple[Path, str], Path] = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            parent = Path(dirpath)
+            for name in sorted(dirnames + filenames):
+                path = parent / name
+                self.paths.add(path)
+                self.folded.setdefault((parent, name.casefold()), path)
+
+    def _covers(self, p: Path) -> bool:
+        return p.is_relative_to(self.root)
+
+    def exists(self, p: Path) -> bool:
+        if not self._covers(p):
+            return p.exists()
+        return p in self.paths
+
+    def find_case_insensitive(self, p: Path) -> Path | None:
+        if not self._covers(p):
+            return find_case_insensitive(p)
+        if p in self.paths:
+            return p
+        return self.folded.get((p.parent, p.name.casefold()))
+
+
+def extract_targets(text: str) -> list[tuple[str, str]]:
+    """Return (kind, target) for every image and link in a Markdown text."""
+
+    targets = [("image", m.group(1).strip()) for m in IMG_PATTERN.finditer(text)]
+    targets += [("link", m.group(1).strip()) for m in LINK_PATTERN.finditer(text)]
+    return targets
+
+
+def check_targets(
+    md: Path, targets: list[tuple[str, str]], index: DocsIndex | None = None
+) -> tuple[list[str], list[str]]:
     errors: list[str] = []
     warnings: list[str] = []
-    text = md.read_text(encoding="utf-8", errors="ignore")
 
-    def _check(pattern: re.Pattern, kind: str):
-        for m in pattern.finditer(text):
-            raw = m.group(1).strip()
-            if is_ignored(raw):
-                continue
-            # strip fragment/query
-            path_only = raw.split("#", 1)[0].split("?", 1)[0]
-            if not path_only:
-                continue
-            abs_path = resolve_path(md.parent, path_only)
-            # Constrain to repo root to avoid escaping
-            try:
-                abs_path.relative_to(ROOT)
-            except ValueError:
-                errors.append(f"{md}: {kind} escapes repo root: {raw}")
-                continue
-            if not abs_path.exists():
+    for kind, raw in targets:
+        if is_ignored(raw):
+            continue
+        # strip fragment/query
+        path_only = raw.split("#", 1)[0].split("?", 1)[0]
+        if not path_only:
+            continue
+        abs_path = resolve_path(md.parent, path_only)
+        # Constrain to repo root to avoid escaping
+        try:
+            abs_path.relative_to(ROOT)
+        except ValueError:
+            errors.append(f"{md}: {kind} escapes repo root: {raw}")
+            continue
+        exists = index.exists(abs_path) if index else abs_path.exists()
+        if not exists:
+            if index:
+                alt = index.find_case_insensitive(abs_path)
+            else:
                 alt = find_case_insensitive(abs_path)
-                if alt is None:
-                    # Only warn for missing links, error for missing images
-                    if kind == "image":
-                        errors.append(f"{md}: missing {kind}: {raw} -> {abs_path.relative_to(ROOT)}")
-                    else:
-                        warnings.append(f"{md}: missing {kind}: {raw} -> {abs_path.relative_to(ROOT)}")
+            if alt is None:
+                # Only warn for missing links, error for missing images
+                if kind == "image":
+                    errors.append(f"{md}: missing {kind}: {raw} -> {abs_path.relative_to(ROOT)}")
                 else:
-                    # Case mismatch is just a warning
-                    warnings.append(
-                        f"{md}: case-mismatch for {kind}: {raw} -> wanted {abs_path.name}, found {alt.name}"
-                    )
+                    warnings.append(f"{md}: missing {kind}: {raw} -> {abs_path.relative_to(ROOT)}")
+            else:
+                # Case mismatch is just a warning
+                warnings.append(
+                    f"{md}: case-mismatch for {kind}: {raw} -> wanted {abs_path.name}, found {alt.name}"
+                )
 
-    _check(IMG_PATTERN, "image")
-    _check(LINK_PATTERN, "link")
     return errors, warnings
 
 
-def main() -> int:
+def check_file(md: Path, index: DocsIndex | None = None) -> tuple[list[str], list[str]]:
+    text = md.read_text(encoding="utf-8", errors="ignore")
+    return check_targets(md, extract_targets(text), index)
+
+
+def load_link_graph(path: Path) -> dict[str, dict] | None:
+    """Load the pages of the converter's link graph, None if unusable."""
+
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    pages = data.get("pages") if isinstance(data, dict) else None
+    return pages if isinstance(pages, dict) else None
+
+
+def graph_targets(page: dict) -> list[tuple[str, str]]:
+    """Return (kind, target) for a page of the link graph, like extract_targets."""
+
+    targets = [("image", target) for target in page.get("images", [])]
+    targets += [("link", target) for target in page.get("links", [])]
+    targets += [("link", target) for target in page.get("files", [])]
+    return targets
+
+
+def _cache_version() -> str:
+    # Cached targets are only valid for the patterns that extracted them
+    key = "\0".join((IMG_PATTERN.pattern, LINK_PATTERN.pattern))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_cache(path: Path) -> dict[str, dict]:
+    """Load {relative md path: {"hash": ..., "targets": [[kind, target], ...]}}."""
+
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _cache_version():
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def save_cache(path: Path, files: dict[str, dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(
+        json.dumps({"version": _cache_version(), "files": files}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    tmp.replace(path)
+
+
+_WORKER_INDEX: DocsIndex | None = None
+
+
+def _init_worker(docs_dir: Path) -> None:
+    global _WORKER_INDEX
+    _WORKER_INDEX = DocsIndex(docs_dir)
+
+
+def _validate(
+    task: tuple[Path, dict | None],
+) -> tuple[list[str], list[str], dict]:
+    """Check one file, reusing its cached targets if its content hash matches.
+
+    Returns errors, warnings and the cache entry for the file.
+    """
+
+    md, entry = task
+    data = md.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry.get("hash") == digest:
+        targets = [(kind, raw) for kind, raw in entry["targets"]]
+    else:
+        targets = extract_targets(data.decode("utf-8", errors="ignore"))
+    errors, warnings = check_targets(md, targets, _WORKER_INDEX)
+    return errors, warnings, {"hash": digest, "targets": targets}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check that images and links in docs/*.md point to existing files."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes checking files in parallel. Default: 1.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=(
+            "Parse every file instead of reusing the targets of unchanged files "
+            "from the cache in .cache/."
+        ),
+    )
+    parser.add_argument(
+        "--link-graph",
+        nargs="?",
+        const=str(LINK_GRAPH_FILE),
+        metavar="PATH",
+        help=(
+            "Check the pages recorded in the converter's link graph (default "
+            f"{LINK_GRAPH_FILE.relative_to(ROOT)}) against it without reading "
+            "them; other pages are parsed as usual."
+        ),
+    )
+    args = parser.parse_args(argv)
+
     if not DOCS_DIR.exists():
         print(f"docs directory not found at {DOCS_DIR}")
         return 1
 
-    md_files = [p for p in DOCS_DIR.rglob("*.md") if p.is_file()]
+    md_files = sorted(
+        (p for p in DOCS_DIR.rglob("*.md") if p.is_file()), key=lambda p: str(p)
+    )
+    graph: dict[str, dict] = {}
+    if args.link_graph:
+        loaded = load_link_graph(Path(args.link_graph))
+        if loaded is None:
+            print(f"Could not read link graph {args.link_graph}")
+            return 1
+        graph = loaded
+    cache = {} if args.no_cache else load_cache(CACHE_FILE)
+    keys = [p.relative_to(DOCS_DIR).as_posix() for p in md_files]
+    tasks = [
+        (md, cache.get(key)) for md, key in zip(md_files, keys) if key not in graph
+    ]
+
+    if args.jobs > 1 and len(tasks) > 1:
+        jobs = min(args.jobs, len(tasks))
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(DOCS_DIR,)
+        ) as pool:
+            results = list(
+                pool.map(_validate, tasks, chunksize=max(1, len(tasks) // (jobs * 4)))
+            )
+    else:
+        _init_worker(DOCS_DIR)
+        results = [_validate(task) for task in tasks]
+
+    if graph:
+        # Pages of the graph are checked from their recorded targets, the
+        # index answers existence checks, so no page is read
+        if _WORKER_INDEX is None:
+            _init_worker(DOCS_DIR)
+        file_results = iter(results)
+        results = []
+        for md, key in zip(md_files, keys):
+            if key in graph:
+                errors, warnings = check_targets(md, graph_targets(graph[key]), _WORKER_INDEX)
+                results.append((errors, warnings, cache.get(key)))
+            else:
+                results.append(next(file_results))
+
     all_errors: list[str] = []
     all_warnings: list[str] = []
-    
-    for md in sorted(md_files, key=lambda p: str(p)):
-        errors, warnings = check_file(md)
+    new_cache: dict[str, dict] = {}
+    for key, (errors, warnings, entry) in zip(keys, results):
         all_errors.extend(errors)
         all_warnings.extend(warnings)
+        if entry is not None:
+            new_cache[key] = entry
+
+    if not args.no_cache:
+        try:
+            save_cache(CACHE_FILE, new_cache)
+        except OSError as e:
+            print(f"Could not write cache {CACHE_FILE}: {e}")
 
     if all_warnings:
         print(f"Found {len(all_warnings)} warning(s):")
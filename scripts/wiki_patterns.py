@@ -0,0 +1,46 @@
+"""Precompiled patterns and lookup tables for MediaWiki markup.
+
+Shared by the converter (link rendering, galleries, image extraction) so
+that every pattern is compiled once at import and file type checks are a
+set lookup on the extension instead of a scan over suffix tuples.
+"""
+
+from __future__ import annotations
+
+import re
+
+HEADING_PATTERN = re.compile(r"^(={1,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+EXT_LINK_PATTERN = re.compile(r"\[(https?://[^\s\]]+)(?:\s+([^\]]+))?\]")
+INT_LINK_PATTERN = re.compile(r"\[\[([^|\]]+)(?:\|([^\]]+))?\]\]")
+CATEGORY_PATTERN = re.compile(
+    r"\[\[(?:Категория|Category|категория|category):([^\]]+)\]\]", re.IGNORECASE
+)
+# colspan=2, rowspan="3" in the attributes of a table cell
+TABLE_SPAN_PATTERN = re.compile(r"\b(colspan|rowspan)\s*=\s*[\"']?\s*(\d+)", re.IGNORECASE)
+# Runs of two or more apostrophes, bold and italic markup; captured so
+# that splitting a line keeps them
+QUOTES_PATTERN = re.compile(r"('{2,})")
+
+# Lowercased prefixes of file references: gallery lines and link targets
+# ([[Файл:...]], [[:Файл:...]] links to the file page itself)
+FILE_PREFIXES = ("файл:", "file:")
+FILE_LINK_PREFIXES = FILE_PREFIXES + (":файл:", ":file:")
+
+# First characters of a list line: items, definition terms and indents
+LIST_MARKERS = ("*", "#", ";", ":")
+
+VIDEO_EXTENSIONS = frozenset({"mp4", "webm", "ogg", "mov", "avi"})
+IMAGE_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "gif", "svg", "webp", "bmp"})
+
+
+def file_extension(filename: str) -> str:
+    """Lowercased extension without the dot, empty if there is none."""
+
+    _, dot, extension = filename.rpartition(".")
+    return extension.lower() if dot else ""
+
+
+def is_file_link_target(target: str) -> bool:
+    """Whether an internal link target points at a file."""
+
+    return target.lower().startswith(FILE_LINK_PREFIXES)
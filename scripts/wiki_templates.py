@@ -0,0 +1,449 @@
+"""Expansion of MediaWiki templates and parser functions.
+
+Page source is parsed into text, template calls ``{{name|arg|key=value}}``
+and parameters ``{{{1|default}}}``, matching braces and links the way the
+MediaWiki preprocessor does. Templates are expanded with their arguments,
+as are the parser functions ``#if``, ``#ifeq`` and ``#switch``; other
+parser functions, magic words and missing templates are left as written.
+
+Template sources come from a lookup function given to TemplateExpander,
+``fetch(name) -> (revision, source) | None``, so the caller decides where
+they live. Every expansion is kept in an LRU cache keyed by the template,
+its revision and the arguments: datasheet pages call the same few
+templates hundreds of times with the same arguments.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import Callable, Union
+
+CACHE_SIZE = 1024  # expansions kept, each the text of one template call
+MAX_DEPTH = 40  # templates expanded inside each other
+TEMPLATE_NAMESPACES = ("шаблон", "template")
+
+# Magic words that stand for a character template arguments cannot contain
+MAGIC_WORDS = {"!": "|", "=": "="}
+# Variables, magic words that look like template calls without a colon.
+# Those with one (DISPLAYTITLE:, DEFAULTSORT:, lc: and the like) are told
+# apart by their prefix, which is not a template namespace.
+MAGIC_VARIABLES = frozenset({
+    "PAGENAME", "PAGENAMEE", "FULLPAGENAME", "FULLPAGENAMEE", "BASEPAGENAME",
+    "BASEPAGENAMEE", "ROOTPAGENAME", "SUBPAGENAME", "SUBJECTPAGENAME", "TALKPAGENAME",
+    "NAMESPACE", "NAMESPACEE", "NAMESPACENUMBER", "SITENAME", "SERVER", "SERVERNAME",
+    "SCRIPTPATH", "STYLEPATH", "CONTENTLANGUAGE", "CONTENTLANG", "DIRMARK",
+    "CURRENTYEAR", "CURRENTMONTH", "CURRENTMONTH1", "CURRENTMONTHNAME",
+    "CURRENTMONTHNAMEGEN", "CURRENTMONTHABBREV", "CURRENTDAY", "CURRENTDAY2",
+    "CURRENTDOW", "CURRENTDAYNAME", "CURRENTTIME", "CURRENTHOUR", "CURRENTWEEK",
+    "CURRENTTIMESTAMP", "LOCALYEAR", "LOCALMONTH", "LOCALMONTH1", "LOCALMONTHNAME",
+    "LOCALMONTHNAMEGEN", "LOCALMONTHABBREV", "LOCALDAY", "LOCALDAY2", "LOCALDOW",
+    "LOCALDAYNAME", "LOCALTIME", "LOCALHOUR", "LOCALWEEK", "LOCALTIMESTAMP",
+    "REVISIONID", "REVISIONDAY", "REVISIONDAY2", "REVISIONMONTH", "REVISIONMONTH1",
+    "REVISIONYEAR", "REVISIONTIMESTAMP", "REVISIONUSER", "REVISIONSIZE",
+    "NUMBEROFPAGES", "NUMBEROFARTICLES", "NUMBEROFFILES", "NUMBEROFEDITS",
+    "NUMBEROFUSERS", "NUMBEROFACTIVEUSERS", "NUMBEROFADMINS", "PAGEID", "CASCADINGSOURCES",
+})
+
+# Comments and nowiki/pre sections are opaque, the rest are the tokens
+# that open, split and close template calls
+_TOKEN_PATTERN = re.compile(
+    r"<!--.*?(?:-->|\Z)|<(nowiki|pre)\b[^>]*>.*?(?:</\1\s*>|\Z)"
+    r"|\{{2,}|\}{2,}|\[\[|\]\]|[|=]",
+    re.DOTALL | re.IGNORECASE,
+)
+_NOINCLUDE_PATTERN = re.compile(r"<noinclude>.*?(?:</noinclude>|\Z)", re.DOTALL | re.IGNORECASE)
+_INCLUDEONLY_PATTERN = re.compile(r"<includeonly>.*?(?:</includeonly>|\Z)", re.DOTALL | re.IGNORECASE)
+_ONLYINCLUDE_PATTERN = re.compile(r"<onlyinclude>(.*?)(?:</onlyinclude>|\Z)", re.DOTALL | re.IGNORECASE)
+_INCLUSION_TAG_PATTERN = re.compile(r"</?(?:noinclude|includeonly|onlyinclude)\s*/?>", re.IGNORECASE)
+# Template calls by name, for looking sources up before expanding
+_CALL_PATTERN = re.compile(r"(?<!\{)\{\{(?!\{)\s*([^{}|#<>\[\]\n]+?)\s*(?=[|}])")
+_NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+# Results that start a table or list start on a line of their own
+_BLOCK_STARTS = ("{|", ":", ";", "#", "*")
+
+TemplateSource = Callable[[str], "tuple[str, str] | None"]
+
+
+class _Part:
+    """One ``|``-separated part of a call, ``name=value`` or just a value."""
+
+    __slots__ = ("name", "value")
+
+    def __init__(self) -> None:
+        self.name: list[_Node] | None = None
+        self.value: list[_Node] = []
+
+
+class _Template:
+    """``{{...}}``: the first part is the name, the others the arguments."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: list[_Part]) -> None:
+        self.parts = parts
+
+
+class _Param:
+    """``{{{...}}}``: the first part is the name, the second the default."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: list[_Part]) -> None:
+        self.parts = parts
+
+
+_Node = Union[str, _Template, _Param]
+
+
+class _Frame:
+    """A call whose closing braces were not seen yet."""
+
+    __slots__ = ("braces", "parts", "links")
+
+    def __init__(self, braces: int) -> None:
+        self.braces = braces  # 2 for a template, 3 for a parameter
+        self.parts = [_Part()]
+        self.links = 0  # open [[ ]], their pipes do not split parts
+
+    def literal(self) -> list[_Node]:
+        """The nodes of a call that is never closed, as written."""
+
+        nodes: list[_Node] = ["{" * self.braces]
+        for index, part in enumerate(self.parts):
+            if index:
+                nodes.append("|")
+            if part.name is not None:
+                nodes.extend(part.name)
+                nodes.append("=")
+            nodes.extend(part.value)
+        return nodes
+
+
+def _brace_frames(count: int) -> tuple[str, tuple[int, ...]]:
+    """Literal braces and the frames, outermost first, opened by a run of braces."""
+
+    if count == 2:
+        return "", (2,)
+    if count == 5:
+        return "", (2, 3)
+    # Parameters inside each other, spare braces are text
+    return "{" * (count % 3), (3,) * (count // 3)
+
+
+def _parse(text: str) -> list[_Node]:
+    """Split wikitext into text, template calls and parameters."""
+
+    root: list[_Node] = []
+    stack: list[_Frame] = []
+    out = root
+    pos = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        first = token[0]
+        if first in "[]":
+            if stack and first == "[":
+                stack[-1].links += 1
+            elif stack and stack[-1].links:
+                stack[-1].links -= 1
+            continue
+        if first in "|=":
+            frame = stack[-1] if stack else None
+            if frame is None or frame.links:
+                continue
+            if first == "=" and (
+                frame.braces != 2 or len(frame.parts) == 1 or frame.parts[-1].name is not None
+            ):
+                continue
+        elif first == "<" and not (stack and token.startswith("<!--")):
+            continue
+
+        out.append(text[pos:match.start()])
+        pos = match.end()
+        if first == "|":
+            stack[-1].parts.append(_Part())
+            out = stack[-1].parts[-1].value
+        elif first == "=":
+            part = stack[-1].parts[-1]
+            part.name, part.value = part.value, []
+            out = part.value
+        elif first == "{":
+            literal, braces = _brace_frames(len(token))
+            if literal:
+                out.append(literal)
+            for size in braces:
+                stack.append(_Frame(size))
+                out = stack[-1].parts[-1].value
+        elif first == "}":
+            count = len(token)
+            while stack and count >= 2:
+                frame = stack.pop()
+                if count < frame.braces:
+                    # {{{name}} is a literal brace and a template call
+                    frame.braces = count
+                    parent = stack[-1].parts[-1].value if stack else root
+                    parent.append("{")
+                else:
+                    parent = stack[-1].parts[-1].value if stack else root
+                count -= frame.braces
+                node = _Template(frame.parts) if frame.braces == 2 else _Param(frame.parts)
+                parent.append(node)
+                out = parent
+            if count:
+                out.append("}" * count)
+        # Comments inside calls are dropped, as MediaWiki does
+    out.append(text[pos:])
+
+    while stack:
+        frame = stack.pop()
+        (stack[-1].parts[-1].value if stack else root).extend(frame.literal())
+    return root
+
+
+def _transcluded_source(text: str) -> str:
+    """The part of a template source that is transcluded."""
+
+    if "<" not in text:
+        return text
+    sections = _ONLYINCLUDE_PATTERN.findall(text)
+    if sections:
+        text = "".join(sections)
+    text = _NOINCLUDE_PATTERN.sub("", text)
+    return _INCLUSION_TAG_PATTERN.sub("", text)
+
+
+def page_source(text: str) -> str:
+    """The source of a page as shown on the page itself, without includeonly sections."""
+
+    if "include" not in text:
+        return text
+    text = _INCLUDEONLY_PATTERN.sub("", text)
+    return _INCLUSION_TAG_PATTERN.sub("", text)
+
+
+def template_title(name: str) -> str:
+    """Canonical name of a template, without namespace: ``шаблон:sensor_x`` -> ``Sensor x``."""
+
+    name = " ".join(name.replace("_", " ").split())
+    namespace, colon, rest = name.partition(":")
+    if colon and namespace.strip().lower() in TEMPLATE_NAMESPACES:
+        name = rest.strip()
+    return name[:1].upper() + name[1:]
+
+
+def _calls_template(name: str) -> bool:
+    """Whether ``{{name}}`` calls a template, not a magic word or a page.
+
+    ``{{:Page}}`` transcludes a page from the main namespace, a colon after
+    anything but a template namespace makes a magic word.
+    """
+
+    if name.startswith(":") or name in MAGIC_WORDS or name in MAGIC_VARIABLES:
+        return False
+    namespace, colon, _ = name.partition(":")
+    return not colon or namespace.strip().lower() in TEMPLATE_NAMESPACES
+
+
+def template_names(text: str) -> set[str]:
+    """Names of the templates a page calls directly, nested calls may be missed."""
+
+    return {
+        template_title(name)
+        for name in _CALL_PATTERN.findall(text)
+        if "{" not in name and _calls_template(name)
+    }
+
+
+def _equal(left: str, right: str) -> bool:
+    """Parser function comparison, numbers by value and other text exactly."""
+
+    if _NUMBER_PATTERN.fullmatch(left) and _NUMBER_PATTERN.fullmatch(right):
+        return float(left) == float(right)
+    return left == right
+
+
+class TemplateExpander:
+    """Expands templates in page sources, with sources looked up by ``fetch``.
+
+    Sources are looked up once per expander; a missing template is looked
+    up as ``None`` and left as written. ``hits`` and ``misses`` count the
+    expansions answered from and added to the cache, ``missing`` holds the
+    names of templates that were called but not found.
+    """
+
+    def __init__(self, fetch: TemplateSource, cache_size: int = CACHE_SIZE) -> None:
+        self._fetch = fetch
+        self._cache_size = cache_size
+        self._templates: dict[str, tuple[str, list[_Node]] | None] = {}
+        # (name, revision, arguments) -> (text, {nested template: revision})
+        self._cache: OrderedDict[tuple, tuple[str, dict[str, str]]] = OrderedDict()
+        self._active: list[str] = []
+        self.hits = self.misses = 0
+        self.missing: set[str] = set()
+
+    def expand(self, text: str, used: dict[str, str] | None = None) -> str:
+        """Expand the templates of a page source.
+
+        ``used`` collects the revision of every template the page uses,
+        nested ones included, "" for missing templates; the page has to
+        be expanded again when one of them changes.
+        """
+
+        text = page_source(text)
+        if "{{" not in text:
+            return text
+        return self._expand(_parse(text), None, {} if used is None else used)
+
+    def revision(self, name: str) -> str:
+        """Current revision of a template, "" if it is missing."""
+
+        template = self._template(name)
+        return "" if template is None else template[0]
+
+    def forget(self, name: str | None = None) -> None:
+        """Look the source of a template, or of all of them, up again.
+
+        Cached expansions stay, they are checked against the revisions of
+        the templates they used when they are reused.
+        """
+
+        if name is None:
+            self._templates.clear()
+        else:
+            self._templates.pop(name, None)
+
+    def _template(self, name: str) -> tuple[str, list[_Node]] | None:
+        if name not in self._templates:
+            found = self._fetch(name)
+            self._templates[name] = (
+                None if found is None else (found[0], _parse(_transcluded_source(found[1])))
+            )
+        return self._templates[name]
+
+    def _expand(self, nodes: list[_Node], args: dict[str, str] | None, used: dict[str, str]) -> str:
+        out: list[str] = []
+        for node in nodes:
+            if type(node) is str:
+                out.append(node)
+            elif type(node) is _Template:
+                out.append(self._call(node, args, used))
+            else:
+                out.append(self._param(node, args, used))
+        return "".join(out)
+
+    def _part_text(self, part: _Part, args: dict[str, str] | None, used: dict[str, str]) -> str:
+        value = self._expand(part.value, args, used)
+        if part.name is None:
+            return value
+        return f"{self._expand(part.name, args, used)}={value}"
+
+    def _as_written(self, head: str, node: _Template, args: dict[str, str] | None, used: dict[str, str]) -> str:
+        parts = [head, *(self._part_text(part, args, used) for part in node.parts[1:])]
+        return "{{" + "|".join(parts) + "}}"
+
+    def _param(self, node: _Param, args: dict[str, str] | None, used: dict[str, str]) -> str:
+        name = self._expand(node.parts[0].value, args, used).strip()
+        if args is not None and name in args:
+            return args[name]
+        if len(node.parts) > 1:
+            return self._part_text(node.parts[1], args, used)
+        return "{{{" + name + "}}}"
+
+    def _call(self, node: _Template, args: dict[str, str] | None, used: dict[str, str]) -> str:
+        head = self._expand(node.parts[0].value, args, used)
+        name = head.strip()
+        if name.startswith("#"):
+            function, colon, test = name.partition(":")
+            handler = self._FUNCTIONS.get(function.strip().lower())
+            if not colon or handler is None:
+                return self._as_written(head, node, args, used)
+            return _block_start(handler(self, test.strip(), node.parts[1:], args, used))
+        if name in MAGIC_WORDS and len(node.parts) == 1:
+            return MAGIC_WORDS[name]
+
+        # Magic words and transcluded pages are not supported
+        title = template_title(name) if _calls_template(name) else ""
+        template = self._template(title) if title else None
+        if template is None:
+            if title:
+                self.missing.add(title)
+                used[title] = ""
+            return self._as_written(head, node, args, used)
+        if title in self._active or len(self._active) >= MAX_DEPTH:
+            # A template loop, MediaWiki shows an error instead
+            return self._as_written(head, node, args, used)
+        revision, body = template
+
+        values: dict[str, str] = {}
+        position = 0
+        for part in node.parts[1:]:
+            if part.name is None:
+                position += 1
+                values[str(position)] = self._expand(part.value, args, used)
+            else:
+                key = self._expand(part.name, args, used).strip()
+                values[key] = self._expand(part.value, args, used).strip()
+
+        key = (title, revision, tuple(sorted(values.items())))
+        cached = self._cache.get(key)
+        if cached is not None and all(
+            self.revision(nested_name) == nested_revision
+            for nested_name, nested_revision in cached[1].items()
+        ):
+            self._cache.move_to_end(key)
+            self.hits += 1
+            text, nested = cached
+        else:
+            self.misses += 1
+            nested = {}
+            self._active.append(title)
+            try:
+                text = self._expand(body, values, nested)
+            finally:
+                self._active.pop()
+            self._cache[key] = (text, nested)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        used[title] = revision
+        used.update(nested)
+        return _block_start(text)
+
+    def _if(self, test: str, parts: list[_Part], args: dict[str, str] | None, used: dict[str, str]) -> str:
+        return self._branch(parts, 0 if test else 1, args, used)
+
+    def _ifeq(self, test: str, parts: list[_Part], args: dict[str, str] | None, used: dict[str, str]) -> str:
+        other = self._part_text(parts[0], args, used).strip() if parts else ""
+        return self._branch(parts, 1 if _equal(test, other) else 2, args, used)
+
+    def _switch(self, test: str, parts: list[_Part], args: dict[str, str] | None, used: dict[str, str]) -> str:
+        matched = False
+        default: _Part | None = None
+        for index, part in enumerate(parts):
+            if part.name is None:
+                # A case that falls through to the next result, or the
+                # default when it is the last part
+                text = self._expand(part.value, args, used).strip()
+                if index == len(parts) - 1:
+                    return text
+                matched = matched or _equal(text, test)
+                continue
+            case = self._expand(part.name, args, used).strip()
+            if matched or _equal(case, test):
+                return self._expand(part.value, args, used).strip()
+            if case == "#default":
+                default = part
+        return "" if default is None else self._expand(default.value, args, used).strip()
+
+    def _branch(self, parts: list[_Part], index: int, args: dict[str, str] | None, used: dict[str, str]) -> str:
+        if index >= len(parts):
+            return ""
+        return self._part_text(parts[index], args, used).strip()
+
+    _FUNCTIONS = {"#if": _if, "#ifeq": _ifeq, "#switch": _switch}
+
+
+def _block_start(text: str) -> str:
+    """A result that starts a table or list is put on a new line, as in MediaWiki."""
+
+    return "\n" + text if text.startswith(_BLOCK_STARTS) else text
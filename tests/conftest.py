@@ -0,0 +1,187 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The converter is a set of scripts, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import convert_mediawiki_to_md as converter  # noqa: E402
+
+
+class FakeWiki:
+    """A MediaWiki stand-in on a local port: raw pages and the API queries the converter sends.
+
+    ``pages`` maps titles to their source and ``revisions`` to their revision
+    id (1 by default); every request is recorded in ``requests``. Requests
+    whose path contains a key of ``failures`` are answered with its statuses
+    first, every answer takes ``delay`` seconds and ``max_active`` is the
+    most requests served at once. Raw pages carry an ETag, the requests
+    answered with 304 Not Modified are listed in ``not_modified``. ``files``
+    are served from /images/ with HTTP Range support, the Range header of
+    every file request is listed in ``ranges``.
+    """
+
+    def __init__(self) -> None:
+        self.pages: dict[str, str] = {}
+        self.revisions: dict[str, int] = {}
+        self.failures: dict[str, list[int]] = {}
+        self.delay = 0.0
+        self.requests: list[str] = []
+        self.not_modified: list[str] = []
+        self.files: dict[str, bytes] = {}
+        self.ranges: list[str | None] = []
+        self.max_active = 0
+        self.url = ""
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def api_calls(self, **params: str) -> list[dict[str, str]]:
+        """The API queries sent so far that have all of ``params``."""
+
+        queries = []
+        for path in self.requests:
+            parts = urllib.parse.urlsplit(path)
+            query = dict(urllib.parse.parse_qsl(parts.query))
+            if parts.path.endswith("/api.php") and params.items() <= query.items():
+                queries.append(query)
+        return queries
+
+    def handle(self, request: BaseHTTPRequestHandler) -> tuple[int, dict[str, str], bytes]:
+        parts = urllib.parse.urlsplit(request.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        if parts.path.endswith("/index.php"):
+            text = self.pages.get(query.get("title"))
+            if text is None:
+                return 404, {}, b""
+            body = text.encode("utf-8")
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == etag:
+                with self._lock:
+                    self.not_modified.append(request.path)
+                return 304, {"ETag": etag}, b""
+            return 200, {"ETag": etag}, body
+        if parts.path.endswith("/api.php"):
+            return 200, {}, json.dumps(self.api(query)).encode("utf-8")
+        if parts.path.startswith("/images/"):
+            return self.file(request, urllib.parse.unquote(parts.path[len("/images/"):]))
+        return 404, {}, b""
+
+    def file(self, request: BaseHTTPRequestHandler, name: str) -> tuple[int, dict[str, str], bytes]:
+        data = self.files.get(name)
+        if data is None:
+            return 404, {}, b""
+        byte_range = request.headers.get("Range")
+        with self._lock:
+            self.ranges.append(byte_range)
+        if byte_range is None:
+            return 200, {}, data
+        start = int(byte_range.removeprefix("bytes=").rstrip("-"))
+        if start >= len(data):
+            return 416, {"Content-Range": f"bytes */{len(data)}"}, b""
+        return 206, {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"}, data[start:]
+
+    def api(self, query: dict[str, str]) -> dict:
+        titles = query["titles"].split("|") if "titles" in query else []
+        if query.get("list") == "allpages":
+            if query.get("apfilterredir") == "redirects":
+                return {"query": {"allpages": []}}
+            return {"query": {"allpages": [{"title": title} for title in self.pages]}}
+        if query.get("prop") in ("revisions|info", "revisions"):
+            pages = {}
+            for i, title in enumerate(titles):
+                if title not in self.pages:
+                    pages[str(-1 - i)] = {"title": title, "missing": ""}
+                    continue
+                revision = {"revid": self.revisions.get(title, 1)}
+                if query["prop"] == "revisions":
+                    revision["slots"] = {"main": {"*": self.pages[title]}}
+                pages[str(i)] = {"title": title, "revisions": [revision]}
+            return {"query": {"pages": pages}}
+        if query.get("prop") == "imageinfo":
+            pages = {}
+            for i, title in enumerate(titles):
+                name = title.partition(":")[2].replace(" ", "_")
+                if name not in self.files:
+                    pages[str(-1 - i)] = {"title": title, "missing": ""}
+                    continue
+                data = self.files[name]
+                info = {
+                    "url": f"{self.url}/images/{urllib.parse.quote(name)}",
+                    "size": len(data),
+                    "sha1": hashlib.sha1(data).hexdigest(),
+                }
+                pages[str(-1 - i)] = {"title": title, "imageinfo": [info]}
+            return {"query": {"pages": pages}}
+        return {}
+
+
+@pytest.fixture
+def wiki(monkeypatch, tmp_path):
+    """Serve a FakeWiki and point the converter, and its output, at a temporary site."""
+
+    fake = FakeWiki()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with fake._lock:
+                fake.requests.append(self.path)
+                fake._active += 1
+                fake.max_active = max(fake.max_active, fake._active)
+                failure = next(
+                    (statuses for key, statuses in fake.failures.items() if key in self.path and statuses),
+                    None,
+                )
+                status = failure.pop(0) if failure else None
+            try:
+                time.sleep(fake.delay)
+                if status is None:
+                    status, headers, body = fake.handle(self)
+                else:
+                    headers, body = {}, b""
+            finally:
+                with fake._lock:
+                    fake._active -= 1
+            self.send_response(status)
+            for name, value in {**headers, "Content-Length": str(len(body))}.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{server.server_port}"
+
+    root = tmp_path / "site"
+    for name, value in {
+        "ROOT": root,
+        "DOCS_DIR": root / "docs",
+        "ASSETS_DIR": root / "docs" / "assets",
+        "SYNC_STATE_FILE": root / ".cache" / "remote_sync.json",
+        "LINK_GRAPH_FILE": root / ".cache" / "link_graph.json",
+        "HTTP_CACHE_DIR": root / ".cache" / "http",
+        "DEFAULT_PAGES_FILE": root / "all_pages.txt",
+        "MEDIAWIKI_BASE_URL": f"{fake.url}/wiki/index.php",
+    }.items():
+        monkeypatch.setattr(converter, name, value)
+    # Retries do not wait
+    monkeypatch.setattr(converter._HTTP_CLIENT, "backoff", 0)
+    yield fake
+    server.shutdown()
+    server.server_close()
+    # main() configures the shared client, limiter and cache for its run
+    converter._HOST_LIMITER.reset(converter.MAX_REQUESTS_PER_HOST)
+    converter._HTTP_CLIENT.reset(converter.MAX_REQUESTS_PER_HOST, converter.HTTP_RETRIES)
+    converter._RESPONSE_CACHE.reset(None)
@@ -0,0 +1,35 @@
+"""Converting many pages: order, laziness and process pools."""
+
+import pytest
+
+import benchmark
+import convert_mediawiki_to_md as converter
+
+PAGES = [f"== Page {i} ==\n[[Page {i + 1}]] ''text''\n" for i in range(40)]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_iter_convert_pages_keeps_order(workers):
+    results = list(converter.iter_convert_pages(PAGES, workers=workers))
+    assert results == [converter.convert_page(text) for text in PAGES]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_convert_pages_reads_pages_as_needed(workers):
+    read = []
+
+    def texts():
+        for text in PAGES:
+            read.append(text)
+            yield text
+
+    results = converter.iter_convert_pages(texts(), workers=workers)
+    next(results)
+    # Only the pages converted ahead of the first result have been read
+    assert len(read) <= max(1, workers * 4)
+    assert len(list(results)) == len(PAGES) - 1
+
+
+def test_extract_image_filenames_matches_convert_page():
+    page = benchmark.link_heavy_page(500)
+    assert converter.extract_image_filenames(page) == set(converter.convert_page(page).assets)
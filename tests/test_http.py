@@ -0,0 +1,115 @@
+"""Wiki requests: API batches, the per-host limit, retries, the response cache and downloads."""
+
+import hashlib
+import urllib.error
+
+import pytest
+
+import convert_mediawiki_to_md as converter
+
+
+def test_api_queries_are_batched(wiki):
+    titles = [f"Page {i}" for i in range(2 * converter.API_TITLES_LIMIT + 20)]
+    wiki.pages.update(dict.fromkeys(titles[:-1], "text\n"))
+    revisions = converter.get_latest_revisions(titles)
+    assert revisions == {
+        **{title: {"revid": 1, "redirect": False} for title in titles[:-1]},
+        titles[-1]: None,
+    }
+    batches = [query["titles"].split("|") for query in wiki.api_calls(prop="revisions|info")]
+    assert [len(batch) for batch in batches] == [
+        converter.API_TITLES_LIMIT, converter.API_TITLES_LIMIT, 20
+    ]
+    assert sum(batches, []) == titles
+
+
+def test_remote_mode_keeps_to_the_per_host_limit(wiki):
+    wiki.pages.update({f"Page {i}": f"[[Page {i + 1}]]\n" for i in range(12)})
+    wiki.delay = 0.05
+    assert converter.main(["--remote", "--jobs", "8", "--per-host", "2"]) == 0
+    assert wiki.max_active == 2
+    assert len(list(converter.DOCS_DIR.glob("Page_*.md"))) == 12
+
+
+def test_remote_mode_retries_busy_answers(wiki):
+    wiki.pages.update({"Alpha": "''alpha''\n", "Beta": "''beta''\n"})
+    wiki.failures["title=Alpha"] = [503, 429]
+    wiki.failures["title=Beta"] = [500, 502, 504]
+    assert converter.main(["--remote", "--retries", "2"]) == 0
+    raw = [path for path in wiki.requests if "index.php" in path]
+    assert raw.count("/wiki/index.php?title=Alpha&action=raw") == 3
+    assert raw.count("/wiki/index.php?title=Beta&action=raw") == 3
+    assert (converter.DOCS_DIR / "Alpha.md").read_text(encoding="utf-8") == "*alpha*"
+    # Out of retries, the page is reported and left out
+    assert not (converter.DOCS_DIR / "Beta.md").exists()
+
+
+def test_client_does_not_retry_other_errors(wiki):
+    converter._HTTP_CLIENT.reset(1, retries=3)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        converter._HTTP_CLIENT.get(f"{wiki.url}/wiki/index.php?title=Missing&action=raw")
+    assert error.value.code == 404
+    assert len(wiki.requests) == 1
+
+
+def test_cached_pages_are_revalidated(wiki):
+    wiki.pages.update({"Alpha": "''alpha''\n", "Beta": "''beta''\n"})
+    assert converter.main(["--remote"]) == 0
+    assert wiki.not_modified == []
+    assert converter.main(["--remote"]) == 0
+    assert sorted(wiki.not_modified) == [
+        "/wiki/index.php?title=Alpha&action=raw",
+        "/wiki/index.php?title=Beta&action=raw",
+    ]
+
+    wiki.not_modified.clear()
+    wiki.pages["Beta"] = "'''beta'''\n"
+    assert converter.main(["--remote"]) == 0
+    assert wiki.not_modified == ["/wiki/index.php?title=Alpha&action=raw"]
+    assert (converter.DOCS_DIR / "Alpha.md").read_text(encoding="utf-8") == "*alpha*"
+    assert (converter.DOCS_DIR / "Beta.md").read_text(encoding="utf-8") == "**beta**"
+
+
+def test_offline_mode_sends_no_requests(wiki):
+    wiki.pages.update({"Alpha": "[[Beta]]\n", "Beta": "''beta''\n"})
+    assert converter.main(["--remote"]) == 0
+    pages = {path.name: path.read_text(encoding="utf-8") for path in converter.DOCS_DIR.glob("*.md")}
+    for path in converter.DOCS_DIR.glob("*.md"):
+        path.unlink()
+
+    wiki.requests.clear()
+    assert converter.main(["--remote", "--offline"]) == 0
+    assert wiki.requests == []
+    assert {path.name: path.read_text(encoding="utf-8") for path in converter.DOCS_DIR.glob("*.md")} == pages
+
+    # A page that is not cached fails without going to the network
+    wiki.pages["Gamma"] = "''gamma''\n"
+    assert converter.main(["--remote", "--offline", "Gamma"]) == 0
+    assert wiki.requests == []
+    assert not (converter.DOCS_DIR / "Gamma.md").exists()
+
+
+def test_download_resumes_a_partial_file(wiki, tmp_path):
+    data = bytes(range(256)) * 1000
+    wiki.files["Pic.png"] = data
+    dest = tmp_path / "Pic.png"
+    dest.with_name("Pic.png.part").write_bytes(data[:1000])
+    sha1 = hashlib.sha1(data).hexdigest()
+    converter._download_file(f"{wiki.url}/images/Pic.png", dest, len(data), sha1)
+    assert wiki.ranges == ["bytes=1000-"]
+    assert dest.read_bytes() == data
+    assert not dest.with_name("Pic.png.part").exists()
+
+
+def test_remote_mode_restarts_a_download_with_a_bad_checksum(wiki):
+    data = bytes(range(256)) * 1000
+    wiki.files["Pic.png"] = data
+    wiki.pages["Alpha"] = "[[Файл:Pic.png|thumb]]\n"
+    # Left by an interrupted download of an older version of the file
+    converter.ASSETS_DIR.mkdir(parents=True)
+    (converter.ASSETS_DIR / "Pic.png.part").write_bytes(b"old" * 1000)
+    assert converter.main(["--remote"]) == 0
+    # The resumed file fails the sha1 check and is downloaded again in full
+    assert wiki.ranges == ["bytes=3000-", None]
+    assert (converter.ASSETS_DIR / "Pic.png").read_bytes() == data
+    assert not (converter.ASSETS_DIR / "Pic.png.part").exists()
@@ -0,0 +1,22 @@
+"""Rewriting pages to use image variants."""
+
+import pytest
+
+import image_variants
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "Photo.jpg",
+        "Photo_(2).jpg",
+        "Screenshot_2023-05-19_at_16-04-02_Eck6.png_(Изображение_PNG_1222_×_1078_пикселей).png",
+    ],
+)
+def test_apply_variants(name):
+    media = {name: {"web": [1600, 1200]}}
+    markdown = image_variants.apply_variants(f"![Фото](assets/{name})\n", media)
+    expected = f"![Фото](assets/web/{name}){{ loading=lazy decoding=async width=1600 height=1200 }}\n"
+    assert markdown == expected
+    # Pages can be rewritten any number of times
+    assert image_variants.apply_variants(markdown, media) == expected
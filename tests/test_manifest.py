@@ -0,0 +1,26 @@
+"""The manifest of incremental local conversion."""
+
+import shutil
+from pathlib import Path
+
+import convert_mediawiki_to_md as converter
+
+
+def test_converter_version_hashes_the_conversion_code(monkeypatch, tmp_path):
+    scripts = Path(converter.__file__).resolve().parent
+    for name in [*converter.CONVERTER_SOURCES, "benchmark.py"]:
+        shutil.copy(scripts / name, tmp_path / name)
+    monkeypatch.setattr(converter, "__file__", str(tmp_path / "convert_mediawiki_to_md.py"))
+    version = converter.converter_version("legacy")
+    assert converter.converter_version("single-pass") != version
+    assert converter.converter_version("legacy", templates=False) != version
+
+    # Other scripts do not make every page stale
+    with (tmp_path / "benchmark.py").open("a", encoding="utf-8") as f:
+        f.write("# changed\n")
+    (tmp_path / "validate_docs.py").write_text("# new\n", encoding="utf-8")
+    assert converter.converter_version("legacy") == version
+
+    with (tmp_path / "wiki_patterns.py").open("a", encoding="utf-8") as f:
+        f.write("# changed\n")
+    assert converter.converter_version("legacy") != version
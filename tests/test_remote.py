@@ -0,0 +1,57 @@
+"""Remote mode against a local MediaWiki stand-in."""
+
+import json
+
+import convert_mediawiki_to_md as converter
+
+
+def load_link_graph():
+    return json.loads(converter.LINK_GRAPH_FILE.read_text(encoding="utf-8"))
+
+
+def test_remote_mode_saves_the_link_graph(wiki):
+    wiki.pages.update({
+        "Alpha": "[[Beta]] [[Missing page]]\n[[Категория:Docs]]\n",
+        "Beta": "[[Alpha]]\n",
+        "Gamma": "no links\n",
+    })
+    assert converter.main(["--remote", "--sync"]) == 0
+    graph = load_link_graph()
+    assert sorted(graph["pages"]) == ["Alpha.md", "Beta.md", "Gamma.md"]
+    assert graph["pages"]["Alpha.md"]["links"] == ["Beta.md", "Missing_page.md"]
+    assert graph["pages"]["Alpha.md"]["categories"] == ["Docs"]
+    assert graph["backlinks"]["Alpha.md"] == ["Beta.md"]
+    assert graph["orphans"] == ["Gamma.md"]
+    assert graph["dangling"] == {"Missing_page.md": ["Alpha.md"]}
+
+    # Pages skipped by --sync keep their links, the changed page gets its new ones
+    wiki.pages["Beta"] = "[[Gamma]]\n"
+    wiki.revisions["Beta"] = 2
+    wiki.requests.clear()
+    assert converter.main(["--remote", "--sync"]) == 0
+    assert [path for path in wiki.requests if "index.php" in path] == [
+        "/wiki/index.php?title=Beta&action=raw"
+    ]
+    graph = load_link_graph()
+    assert sorted(graph["pages"]) == ["Alpha.md", "Beta.md", "Gamma.md"]
+    assert graph["pages"]["Beta.md"]["links"] == ["Gamma.md"]
+    assert graph["backlinks"] == {
+        "Beta.md": ["Alpha.md"],
+        "Gamma.md": ["Beta.md"],
+        "Missing_page.md": ["Alpha.md"],
+    }
+    assert graph["orphans"] == ["Alpha.md"]
+
+    # A deleted page leaves the graph
+    del wiki.pages["Gamma"]
+    assert converter.main(["--remote", "--sync"]) == 0
+    assert sorted(load_link_graph()["pages"]) == ["Alpha.md", "Beta.md"]
+
+
+def test_remote_input_page_keeps_the_link_graph(wiki):
+    wiki.pages.update({"Alpha": "[[Beta]]\n", "Beta": "[[Alpha]]\n"})
+    assert converter.main(["--remote"]) == 0
+    graph = load_link_graph()
+    assert sorted(graph["pages"]) == ["Alpha.md", "Beta.md"]
+    assert converter.main(["--remote", "Alpha"]) == 0
+    assert load_link_graph() == graph
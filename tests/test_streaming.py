@@ -0,0 +1,147 @@
+"""convert_lines and convert_file_streaming against the whole-page conversion."""
+
+import dataclasses
+import io
+import random
+import tracemalloc
+
+import pytest
+
+import benchmark
+import convert_mediawiki_to_md as converter
+from test_engines import fuzz_pages
+
+
+def stream_pages() -> dict[str, str]:
+    """Pages with many blocks: tables after tables, blank lines and galleries."""
+
+    rnd = random.Random(0)
+    pages = {
+        f"tables_{name}": benchmark.tables_page(12, separator)
+        for name, separator in benchmark.TABLE_SEPARATORS.items()
+    }
+    pages["mixed"] = benchmark.GENERATORS["mixed"](rnd, 2)
+    pages["huge_gallery"] = benchmark.GENERATORS["huge_gallery"](rnd, 1)
+    # A heading swallows the blank lines, empty tables and galleries after it
+    pages["headings"] = (
+        "== Пусто ==\n\n{|\n|}\n\n<gallery>\n</gallery>\n{|\n| a\n|}\n"
+        "== Таблица ==\n\n\n{|\n! a\n|}\n{|\n|}\n<gallery>\nФайл:a.png\n</gallery>\n"
+        "== Конец ==\n\n<gallery>\n</gallery>\n"
+    )
+    # Markup spanning blank lines
+    pages["spanning"] = (
+        "==\n\nЗаголовок ==\n\n[[Страница|подпись\n\nдальше]] [https://example.org\n\nx]\n"
+        "[[Категория:A\n\nB]]\n''a\n\nb''\n"
+    )
+    return {
+        f"{name}{suffix}": text.rstrip("\n") + ending
+        for name, text in pages.items()
+        for suffix, ending in (("", "\n"), ("_no_newline", ""), ("_blank_lines", "\n\n\n"))
+    }
+
+
+def streamed(text: str) -> str:
+    return "".join(converter.convert_lines(text.splitlines(keepends=True)))
+
+
+@pytest.mark.parametrize("name, text", sorted(stream_pages().items()))
+def test_stream_pages(name, text):
+    assert streamed(text) == converter.convert_text(text)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fuzz(seed):
+    for text in fuzz_pages(1000 + seed, 500):
+        assert streamed(text) == converter.convert_text(text)
+
+
+@pytest.mark.parametrize("ending", ["\n", "\r\n", "\r", ""])
+def test_line_breaks(ending):
+    text = ending.join(["== A ==", "* a", "", "[[B|c", "d]]", "\x85x", ""])
+    lines = io.StringIO(text, newline="")
+    assert "".join(converter.convert_lines(lines)) == converter.convert_text(text)
+
+
+def test_small_chunks(monkeypatch):
+    # Pieces are handed on after every few lines
+    monkeypatch.setattr(converter._InlineWriter, "CHUNK_LINES", 2)
+    for text in [*stream_pages().values(), *fuzz_pages(2000, 300)]:
+        assert streamed(text) == converter.convert_text(text)
+
+
+def test_convert_file_streaming(tmp_path):
+    text = stream_pages()["mixed"] + "[[Файл:Фото_(2).jpg|thumb|подпись]]\n"
+    src = tmp_path / "page.mediawiki"
+    src.write_text(text, encoding="utf-8")
+    dst = tmp_path / "page.md"
+    result, output_hash = converter.convert_file_streaming(src, dst, str.upper)
+
+    page = converter.convert_page(text)
+    assert dst.read_text(encoding="utf-8") == page.markdown.upper()
+    assert output_hash == converter._hash_text(page.markdown.upper())
+    assert result == dataclasses.replace(page, markdown="")
+    assert not (tmp_path / "page.md.tmp").exists()
+
+    # Without an output only what the page refers to is collected
+    assert converter.convert_file_streaming(src, None) == (
+        result, converter._hash_text(page.markdown)
+    )
+
+
+@pytest.mark.parametrize("separator", sorted(benchmark.TABLE_SEPARATORS))
+def test_memory_does_not_grow_with_the_page(separator):
+    peaks = []
+    for tables in (25, 400):
+        lines = benchmark.tables_page(tables, benchmark.TABLE_SEPARATORS[separator])
+        lines = lines.splitlines(keepends=True)
+        tracemalloc.start()
+        try:
+            for _ in converter.convert_lines(lines):
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    assert peaks[1] < 2 * peaks[0]
+
+
+def run_local_mode(monkeypatch, root, argv=()):
+    for name, path in {
+        "ROOT": root,
+        "MEDIAWIKI_DIR": root / "mediawiki",
+        "DOCS_DIR": root / "docs",
+        "ASSETS_DIR": root / "docs" / "assets",
+        "MANIFEST_FILE": root / ".cache" / "convert_manifest.json",
+        "LINK_GRAPH_FILE": root / ".cache" / "link_graph.json",
+        "IMAGE_VARIANTS_FILE": root / ".cache" / "image_variants.json",
+        "HTTP_CACHE_DIR": root / ".cache" / "http",
+    }.items():
+        monkeypatch.setattr(converter, name, path)
+    (root / "docs").mkdir(parents=True)
+    (root / "mediawiki").mkdir()
+    for name, text in stream_pages().items():
+        (root / "mediawiki" / f"{name}.mediawiki").write_text(text, encoding="utf-8")
+    (root / "mediawiki" / "Шаблон_T.mediawiki").write_text("''шаблон''", encoding="utf-8")
+    (root / "mediawiki" / "templates.mediawiki").write_text("{{T}}\n== A ==\n", encoding="utf-8")
+    assert converter.main(["--offline", *argv]) == 0
+    return {
+        path.name: path.read_text(encoding="utf-8")
+        for path in [*(root / "docs").glob("*.md"), root / ".cache" / "convert_manifest.json"]
+    }
+
+
+def test_main_streams_large_pages(monkeypatch, tmp_path):
+    whole = run_local_mode(monkeypatch, tmp_path / "whole")
+    monkeypatch.setattr(converter, "STREAM_THRESHOLD", -1)
+    streamed = []
+    convert_file_streaming = converter.convert_file_streaming
+
+    def spy(src, *args):
+        streamed.append(src.name)
+        return convert_file_streaming(src, *args)
+
+    monkeypatch.setattr(converter, "convert_file_streaming", spy)
+    assert run_local_mode(monkeypatch, tmp_path / "streamed") == whole
+    # Templates are expanded on the whole source
+    assert "templates.mediawiki" not in streamed
+    assert len(streamed) == len(stream_pages()) + 1
+    assert run_local_mode(monkeypatch, tmp_path / "workers", ["--workers", "2"]) == whole
@@ -0,0 +1,31 @@
+"""Template expansion."""
+
+import wiki_templates
+
+PAGE = (
+    "{{PAGENAME}} {{DISPLAYTITLE:Заголовок}} {{DEFAULTSORT:Ключ}} {{lc:ABC}} "
+    "{{:Страница}} {{Шаблон:Датчик|a}} {{Template:датчик|b}} {{Нет}} {{!}}"
+)
+
+
+def test_magic_words_are_not_templates():
+    fetched = []
+
+    def fetch(name):
+        fetched.append(name)
+        return ("1", "<{{{1}}}>") if name == "Датчик" else None
+
+    expander = wiki_templates.TemplateExpander(fetch)
+    used = {}
+    text = expander.expand(PAGE, used)
+    assert text == (
+        "{{PAGENAME}} {{DISPLAYTITLE:Заголовок}} {{DEFAULTSORT:Ключ}} {{lc:ABC}} "
+        "{{:Страница}} <a> <b> {{Нет}} |"
+    )
+    assert fetched == ["Датчик", "Нет"]
+    assert expander.missing == {"Нет"}
+    assert used == {"Датчик": "1", "Нет": ""}
+
+
+def test_template_names():
+    assert wiki_templates.template_names(PAGE) == {"Датчик", "Нет"}